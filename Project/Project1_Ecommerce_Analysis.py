@@ -1,23 +1,27 @@
-import streamlit as st
+import math
 
-# Data manipulation
-import pandas as pd
-import numpy as np
-from scipy.stats import f_oneway
+import streamlit as st
 
-# Data viz
-import duckdb as db
-import seaborn as sns
-import matplotlib.pyplot as plt
-import plotly.graph_objs as ply
+# Shared data and SQL helpers
+from utils.data_browser import data_browser
+from utils.figures import show_figure
+from utils.filters import require_rows, rollup_source, sidebar_filters
+from utils.group_stats import anova, stats_query
+from utils.query import run_batch, sql
 
-# SQL function
-def sql(sql_query):
-    return db.sql(sql_query).to_df()
 
 # --- Title ---
 st.title("E-commerce Analytics for a Company's Sales Strategy ")
 
+# Sidebar filters, applied inside every analysis query below
+filters = sidebar_filters('ecommerce', 'Order_Date', ('Category', 'Payment_Method'))
+where, params = filters.where()
+monthly_source, monthly_params = rollup_source('ecommerce_monthly', filters)
+
+# Measures compared across the groups of each column in the ANOVA section
+ANOVA_MEASURES = {'delivery_days': 'Delivery delay (days)', 'total_sales': 'Order value'}
+ANOVA_GROUPS = ('Category', 'Payment_Method')
+
 st.markdown("---")
 
 # --- BACKGROUND ---
@@ -42,16 +46,11 @@ The data used is information about E-commerce X's customer accounts.
 </p>
 """, unsafe_allow_html=True)
 
-df = pd.read_csv('./Assets/ecommerce_data.csv', parse_dates=['Order_Date', 'Delivery_Date'])
+# Duplicated rows left after cleaning
+st.dataframe(sql("SELECT * EXCLUDE (total_sales, delivery_days, delay_bucket) FROM ecommerce GROUP BY ALL HAVING COUNT(*) > 1", arrow=True))
 
-df.loc[df.duplicated()]
-
-df = df.dropna(subset= ['Order_ID', 'Customer_ID', 'Price', 'Product_ID', 'Product_Name', 'Order_Date', 'Delivery_Date'])
-
-df.reset_index(drop= True, inplace= True)
-
-# Menampilkan DataFrame di Streamlit
-st.dataframe(df)
+# Menampilkan DataFrame di Streamlit, satu halaman setiap kali
+data_browser('ecommerce')
 
 st.markdown("---")
 
@@ -62,34 +61,62 @@ Companies can analyze sales in each month from 2020 - 2023 in each month via the
 </p>
 """, unsafe_allow_html=True)
 
-Sales_EveryMonths = sql(
-    """
-    with sales as(
-        select
-            Quantity * Price as total_sales,
-            Order_Date
-        from df
-        )
+# The aggregations of the page are independent, they run together on the
+# query pool and each section below reads its result. Results stay Arrow
+# tables, charts convert them to pandas only when they are drawn.
+# Monthly totals are materialised once per data load in ecommerce_monthly
+results = run_batch(
+    arrow=True,
+    sales_every_month=(f"""
     SELECT 
-        strftime(Order_Date, '%Y - %m') AS month,
-        SUM(total_sales) as sales_every_month
-    FROM sales
-    GROUP BY month
+        strftime(month, '%Y - %m') AS month,
+        total_sales as sales_every_month
+    FROM {monthly_source}
     ORDER BY month
-    """
+    """, monthly_params),
+    delay_delivery=(f"""
+    SELECT 
+        delay_bucket AS Delay_Category,
+        COUNT(Order_ID) AS Total_Orders,
+        ROUND(COUNT(Order_ID) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS Percentage
+    FROM ecommerce
+    {where}
+    GROUP BY Delay_Category
+    ORDER BY Percentage DESC;
+    """, params),
+    payment=(f"""
+    SELECT
+        Payment_Method,
+        COUNT(Payment_Method) as Total_Method
+    FROM ecommerce
+    {where}
+    GROUP BY Payment_Method
+    ORDER BY Total_Method DESC
+    """, params),
+    # count, mean and squared deviations per group of both columns, one scan
+    group_stats=(stats_query('ecommerce', ANOVA_MEASURES, ANOVA_GROUPS, where), params),
 )
 
-st.dataframe(Sales_EveryMonths)
+Sales_EveryMonths = results["sales_every_month"]
+require_rows(Sales_EveryMonths)
+
+def plot_sales_every_month(Sales_EveryMonths):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-fig = plt.figure(figsize=(12, 6))
-sns.lineplot(data= Sales_EveryMonths, x= 'month', y= 'sales_every_month')
+    fig = plt.figure(figsize=(12, 6))
+    sns.lineplot(data= Sales_EveryMonths, x= 'month', y= 'sales_every_month')
 
-plt.xlabel('Month')
-plt.ylabel('Total Sales')
-plt.title('Sales trends every month')
-plt.xticks(rotation=60)
+    plt.xlabel('Month')
+    plt.ylabel('Total Sales')
+    plt.title('Sales trends every month')
+    plt.xticks(rotation=60)
+    return fig
+
+st.dataframe(Sales_EveryMonths)
 
-st.pyplot(fig)
+# Rendered once per data version, then served from the image cache
+show_figure(plot_sales_every_month, Sales_EveryMonths)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -104,28 +131,15 @@ it could be through delays in the delivery of stuff which has influenced the dec
 Below are patterns of delivery delays based on delivery method or product category :
 """, unsafe_allow_html=True)
 
-Delay_Delivery = sql(
-    """
-        SELECT 
-            CASE 
-            WHEN DATE_PART('day', Delivery_Date - Order_Date) == 0 THEN 'On Time or Early'
-            WHEN DATE_PART('day', Delivery_Date - Order_Date) BETWEEN 1 AND 1 THEN '1 Day Late'
-            WHEN DATE_PART('day', Delivery_Date - Order_Date) BETWEEN 2 AND 3 THEN '2-3 Days Late'
-            WHEN DATE_PART('day', Delivery_Date - Order_Date) > 3 THEN '4+ Days Late'
-        END AS Delay_Category,
-        COUNT(Order_ID) AS Total_Orders,
-        ROUND(COUNT(Order_ID) * 100.0 / (SELECT COUNT(*) FROM df), 2) AS Percentage
-        FROM df
-        GROUP BY Delay_Category
-        ORDER BY Percentage DESC;
-    """
-)
+Delay_Delivery = results["delay_delivery"]
 st.title("Delivery Delay Analysis")
 
 st.dataframe(Delay_Delivery)
 
-labels = Delay_Delivery["Delay_Category"]
-values = Delay_Delivery["Total_Orders"]
+import plotly.graph_objs as ply
+
+labels = Delay_Delivery["Delay_Category"].to_pylist()
+values = Delay_Delivery["Total_Orders"].to_pylist()
 explode = [0.1 if i == max(values) else 0 for i in values]
 
 fig = ply.Figure(
@@ -151,23 +165,14 @@ By knowing what methods are used, companies can manage incoming income from the
 </p>
 """, unsafe_allow_html=True)
 
-Payment = sql(
-    """
-    SELECT
-        Payment_Method,
-        COUNT(Payment_Method) as Total_Method
-    FROM df
-    GROUP BY Payment_Method
-    ORDER BY Total_Method DESC
-    """
-)
+Payment = results["payment"]
 
 st.title("Payment Method Analysis")
 
 st.dataframe(Payment)
 
-count_labels = Payment["Payment_Method"]
-count_value = Payment["Total_Method"]
+count_labels = Payment["Payment_Method"].to_pylist()
+count_value = Payment["Total_Method"].to_pylist()
 explode = [0.1 if i == max(count_value) else 0 for i in count_value]
 
 fig2 = ply.Figure(
@@ -177,6 +182,28 @@ fig2.update_layout(title_text="Distribution of Payment Methods")
 
 st.plotly_chart(fig2)
 
+st.markdown("""
+<p style='text-align: justify; padding: 1px;'>
+Do delivery delays or order values really differ between product categories or payment methods?
+A one-way ANOVA compares the variation between the groups with the variation inside them :
+</p>
+""", unsafe_allow_html=True)
+
+st.title("Differences Between Groups (ANOVA)")
+
+Anova = anova(results["group_stats"], ANOVA_MEASURES, ANOVA_GROUPS).to_pandas()
+Anova["measure"] = Anova["measure"].map(ANOVA_MEASURES)
+st.dataframe(Anova)
+
+for row in Anova.itertuples():
+    if math.isnan(row.p_value):
+        st.markdown(f"- **{row.measure}** by {row.dimension}: not enough groups in the selection to compare")
+    elif row.p_value < 0.05:
+        st.markdown(f"- **{row.measure}** differs by {row.dimension} (p = {row.p_value:.3g}), "
+                    f"the groups explain {row.eta_squared:.1%} of its variance")
+    else:
+        st.markdown(f"- **{row.measure}** does not differ significantly by {row.dimension} (p = {row.p_value:.3g})")
+
 st.markdown("""
 ### Conclusion
 <p style='text-align: justify; padding: 1px;'>
@@ -187,6 +214,8 @@ From this visual we can see several points of analysis:
 for sales in terms of increasing or decreasing each month</li>
 <li>Delays in delivery can be a factor in decreasing sales, 
 because customers expect fast delivery from sellers</li>
+<li>The ANOVA shows whether delivery delays and order values actually depend on the category 
+or the payment method, or only look different by chance</li>
 <li>Having many payment methods makes it easier for customers to buy goods, 
 especially in e-commerce, because not all customers carry cash nowadays</li>
 </ul>
@@ -1,28 +1,20 @@
 import streamlit as st
 
-# Data Manipulation
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
-
-# Data visualization
-import duckdb as db
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.colors as mcolors
-import matplotlib.ticker as mticker
-from matplotlib.ticker import MaxNLocator
+# Shared data and SQL helpers
+from utils.data_browser import data_browser
+from utils.figures import show_figure
+from utils.filters import require_rows, rollup_source, sidebar_filters
+from utils.query import sql
 
 # choose chart style
-import matplotlib as mpl
-mpl.style.use('ggplot')
-
-# SQL function
-def sql(sql_query):
-    return db.sql(sql_query).to_df()
+CHART_STYLE = 'ggplot'
 
 st.title("Financial Data Analysis")
 
+# Sidebar filters, applied inside the analysis queries below
+filters = sidebar_filters('financial', 'date')
+monthly_source, monthly_params = rollup_source('financial_monthly', filters)
+
 st.markdown("---")
 
 # --- BACKGROUND ---
@@ -43,18 +35,8 @@ The dataset contains Financial data from a company in 2023.
 </p>
 """, unsafe_allow_html=True)
 
-df = pd.read_csv('./Assets/financial_data.csv', parse_dates=['Date'])
-
-# Change the string format of column names to make queries easier
-df.columns = (
-    df.columns.str.lower()
-    .str.replace(' ', '_')
-    .str.replace('(', '')
-    .str.replace(')', '')
-)
-
-# Display the DataFrame in Streamlit
-st.dataframe(df)
+# Display the DataFrame in Streamlit, one page of rows at a time
+data_browser('financial')
 
 # --- Comparison between Revenue, Expenses and Profit every month in 2023 ---
 
@@ -69,18 +51,21 @@ st.markdown("""
 ### Comparison between Revenue, Expenses and Profit every month in 2023
 """, unsafe_allow_html=True)
 
+# Monthly totals are materialised once per data load in financial_monthly
 Comparison = sql(
-    """
+    f"""
     SELECT 
-        DATE_TRUNC('month', Date) AS month,
-        SUM(Revenue) AS total_revenue,
-        SUM(Expenses) AS total_expenses, 
-        SUM(Profit) AS total_profit
-    FROM df
-    GROUP BY month
+        month,
+        total_revenue,
+        total_expenses, 
+        total_profit
+    FROM {monthly_source}
     ORDER BY month
-    """
+    """,
+    params=monthly_params,
+    arrow=True,
 )
+require_rows(Comparison)
 
 Comparison_per_month = sql(
     """
@@ -90,43 +75,52 @@ Comparison_per_month = sql(
         total_expenses,
         total_profit
     FROM Comparison
-    """
+    """,
+    Comparison=Comparison
 )
 
 Comparison_per_month = Comparison_per_month.set_index('month_year')
 
-st.dataframe(Comparison_per_month)
 
+def plot_comparison(Comparison_per_month):
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as mticker
+    import numpy as np
 
-fig, ax = plt.subplots(figsize=(16, 8)) 
+    fig, ax = plt.subplots(figsize=(16, 8)) 
 
-bar_width = 0.3  
-spacing = 0.4    
-index = np.arange(len(Comparison_per_month.index)) * (bar_width * 3 + spacing)
+    bar_width = 0.3  
+    spacing = 0.4    
+    index = np.arange(len(Comparison_per_month.index)) * (bar_width * 3 + spacing)
 
-ax.bar(index, Comparison_per_month['total_revenue'], bar_width, color='red', label='Total Revenue')
+    ax.bar(index, Comparison_per_month['total_revenue'], bar_width, color='red', label='Total Revenue')
 
-ax.bar(index + bar_width, Comparison_per_month['total_expenses'], bar_width, color='yellow', label='Total Expenses')
+    ax.bar(index + bar_width, Comparison_per_month['total_expenses'], bar_width, color='yellow', label='Total Expenses')
 
-ax.bar(index + bar_width * 2, Comparison_per_month['total_profit'], bar_width, color='green', label='Total Profit')
+    ax.bar(index + bar_width * 2, Comparison_per_month['total_profit'], bar_width, color='green', label='Total Profit')
 
-ax.set_xticks(index + bar_width)
-ax.set_xticklabels(Comparison_per_month.index, rotation=35)
+    ax.set_xticks(index + bar_width)
+    ax.set_xticklabels(Comparison_per_month.index, rotation=35)
 
-ax.yaxis.set_major_locator(mticker.MultipleLocator(100000))
-ax.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax.yaxis.set_major_formatter('{x:,.0f}')
+    ax.yaxis.set_major_locator(mticker.MultipleLocator(100000))
+    ax.yaxis.set_minor_locator(mticker.AutoMinorLocator())
+    ax.yaxis.set_major_formatter('{x:,.0f}')
 
-ax.set_title('Comparison Between Revenue, Expenses and Profit Every Month')
-ax.set_xlabel('Month')
-ax.set_ylabel('Amount')
+    ax.set_title('Comparison Between Revenue, Expenses and Profit Every Month')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Amount')
 
-ax.tick_params(axis='y', labelsize=10)
+    ax.tick_params(axis='y', labelsize=10)
 
-ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5))
+    ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5))
 
-plt.tight_layout()
-st.pyplot(fig)
+    plt.tight_layout()
+    return fig
+
+st.dataframe(Comparison_per_month)
+
+# Rendered once per data version, then served from the image cache
+show_figure(plot_comparison, Comparison_per_month, style=CHART_STYLE)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -141,21 +135,25 @@ using linear regression.
 </p>
 """, unsafe_allow_html=True)
 
-fig2, ax = plt.subplots(figsize=(12, 6))
-Comparison_per_month['total_revenue'].plot(kind='bar', ax=ax, color='mediumslateblue', label='Total Revenue')
-Comparison_per_month['total_expenses'].plot(kind='bar', ax=ax, color='lightblue', label='Total Profit')
+def plot_revenue_and_expenses(Comparison_per_month):
+    import matplotlib.pyplot as plt
+
+    fig2, ax = plt.subplots(figsize=(12, 6))
+    Comparison_per_month['total_revenue'].plot(kind='bar', ax=ax, color='mediumslateblue', label='Total Revenue')
+    Comparison_per_month['total_expenses'].plot(kind='bar', ax=ax, color='lightblue', label='Total Profit')
 
-ax.set_title('Revenue and Expenses by Month')
-ax.set_xlabel('Month')
-ax.set_ylabel('Amount')
+    ax.set_title('Revenue and Expenses by Month')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Amount')
 
-ax.legend()
+    ax.legend()
 
-plt.xticks(rotation=45)
-ax.ticklabel_format(axis= 'y', style= 'plain', useOffset= False)
-ax.yaxis.set_major_locator(plt.MultipleLocator(100000))
+    plt.xticks(rotation=45)
+    ax.ticklabel_format(axis= 'y', style= 'plain', useOffset= False)
+    ax.yaxis.set_major_locator(plt.MultipleLocator(100000))
+    return fig2
 
-st.pyplot(fig2, use_container_width=False)
+show_figure(plot_revenue_and_expenses, Comparison_per_month, style=CHART_STYLE, use_container_width=False)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -164,46 +162,52 @@ we can get the results of linear regression as follows:
 </p>
 """, unsafe_allow_html=True)
 
-Comparison_per_month = Comparison_per_month.reset_index()
+def plot_regression(a, b, predicted_revenue):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-a = np.array(Comparison_per_month['total_expenses']).reshape(-1, 1)
-b = np.array(Comparison_per_month['total_revenue'])
+    # Gunakan style yang bersih
+    with sns.axes_style("whitegrid"):
+        # Buat plot dengan ukuran yang pas
+        fig3, ax = plt.subplots(figsize=(10, 6))
 
-model = LinearRegression()
-model.fit(a, b)
+    # Plot data
+    ax.scatter(a, b, color='blue', label='Actual Data')
+    ax.plot(a, predicted_revenue, color='red', label='Regression Line')
 
-predicted_revenue = model.predict(a)
+    # Format sumbu dan label
+    ax.set_xlabel('Expenses')
+    ax.set_ylabel('Revenue')
+    ax.legend()
+    ax.grid(True, linestyle="--", alpha=0.6)
 
-# Streamlit UI
-st.write(f"### Linear Regression Analysis")
-st.write(f"##### Slope (β1): {model.coef_[0]:.2f}")
-st.write(f"##### Intercept (β0): {model.intercept_:.2f}")
+    # Pastikan label tidak berputar
+    plt.xticks(rotation=0)
 
+    plt.ticklabel_format(style='plain', axis='y')
+    return fig3
 
+# Data manipulation for the regression
+import numpy as np
+from sklearn.linear_model import LinearRegression
 
-# Gunakan style yang bersih
-sns.set_style("whitegrid")
-
-# Buat plot dengan ukuran yang pas
-fig3, ax = plt.subplots(figsize=(10, 6))
+regression_data = Comparison_per_month.reset_index()
 
-# Plot data
-ax.scatter(a, b, color='blue', label='Actual Data')
-ax.plot(a, predicted_revenue, color='red', label='Regression Line')
+a = np.array(regression_data['total_expenses']).reshape(-1, 1)
+b = np.array(regression_data['total_revenue'])
 
-# Format sumbu dan label
-ax.set_xlabel('Expenses')
-ax.set_ylabel('Revenue')
-ax.legend()
-ax.grid(True, linestyle="--", alpha=0.6)
+model = LinearRegression()
+model.fit(a, b)
 
-# Pastikan label tidak berputar
-plt.xticks(rotation=0)
+predicted_revenue = model.predict(a)
 
-plt.ticklabel_format(style='plain', axis='y')
+# Streamlit UI
+st.write(f"### Linear Regression Analysis")
+st.write(f"##### Slope (β1): {model.coef_[0]:.2f}")
+st.write(f"##### Intercept (β0): {model.intercept_:.2f}")
 
 # Tampilkan di Streamlit tanpa auto-resize
-st.pyplot(fig3, use_container_width=False)
+show_figure(plot_regression, a, b, predicted_revenue, style=CHART_STYLE, use_container_width=False)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -1,21 +1,40 @@
 import streamlit as st
 
 # Data Manipulation
-import pandas as pd
+import datetime
 
-# Data visualization
-import duckdb as db
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MultipleLocator
-import seaborn as sns
-import matplotlib.dates as mdates
+# Shared data and SQL helpers
+from utils.data_browser import data_browser
+from utils.figures import show_figure
+from utils import hll
+from utils.filters import require_rows, rollup_source, sidebar_filters
+from utils.query import shared_scan, sql
+from utils.topk import TOPK_CAPACITY, influencers, top_query
 
-# SQL function
-def sql(sql_query):
-    return db.sql(sql_query).to_df()
 
 st.title("Social Media Analysis")
 
+# Sidebar filters, applied inside every analysis query below. The monthly
+# and hourly sections are about 2023 (the sample also holds a few posts of
+# December 2022), the influencer ranking covers every post
+filters = sidebar_filters('social_media', 'post_date', ('platform',))
+year_2023 = filters.within(datetime.date(2023, 1, 1), datetime.date(2023, 12, 31))
+where, params = filters.where()
+where_2023, params_2023 = year_2023.where()
+monthly_source, monthly_params = rollup_source('social_media_user_monthly', year_2023)
+
+# Distinct users are counted exactly, or estimated from the HyperLogLog
+# sketches stored per month, hour and platform (utils/hll.py)
+with st.sidebar:
+    approximate = st.toggle("Approximate user counts", key="social_approximate_users")
+
+def users_caption():
+    if approximate:
+        st.caption(
+            f"Users estimated from HyperLogLog sketches ({hll.REGISTERS:,} registers): "
+            f"standard error ±{hll.relative_error():.1%}, 95% of the counts within ±{2 * hll.relative_error():.1%}."
+        )
+
 st.markdown("---")
 
 st.markdown("""
@@ -35,18 +54,8 @@ The dataset contains some sample data of social media in 2023.
 </p>
 """, unsafe_allow_html=True)
 
-df = pd.read_csv('./Assets/sample_social_media_data.csv', parse_dates=['post_date'])
-
-# Change the string format of column names to make queries easier
-df.columns = (
-    df.columns.str.lower()
-    .str.replace(' ', '_')
-    .str.replace('(', '')
-    .str.replace(')', '')
-)
-
-# Display the DataFrame in Streamlit
-st.dataframe(df)
+# Display the DataFrame in Streamlit, one page of rows at a time
+data_browser('social_media')
 
 # --- users who use the platform more than 1 ---
 
@@ -54,118 +63,184 @@ st.markdown("""
 ### Total Interactions and Total Users per Month on 2023
 """, unsafe_allow_html=True)
 
+# Per user, platform and month totals are materialised in social_media_user_monthly,
+# the per user and the per month figures below come from one scan of it
+monthly_2023 = shared_scan(
+    monthly_source,
+    groupings={
+        "per_user_month": ("username", "month"),
+        "per_month": ("month",),
+    },
+    measures=(
+        ("platforms", "GROUP_CONCAT(DISTINCT platform)"),
+        ("total_interactions", "SUM(interactions)"),
+        *(() if approximate else (
+            ("total_users", "COUNT(DISTINCT username)"),
+            ("facebook", "COUNT(DISTINCT CASE WHEN platform = 'Facebook' THEN username END)"),
+            ("instagram", "COUNT(DISTINCT CASE WHEN platform = 'Instagram' THEN username END)"),
+            ("twitter", "COUNT(DISTINCT CASE WHEN platform = 'Twitter' THEN username END)"),
+        )),
+    ),
+    params=monthly_params,
+    arrow=True,
+)
+require_rows(monthly_2023["per_month"])
+
+per_month = monthly_2023["per_month"]
+if approximate:
+    # users of every month and of every platform in it, merged from the
+    # (month, platform) sketches instead of counted over the posts
+    users_source, users_params = rollup_source('social_media_users_hll', year_2023)
+    users_per_month = sql(
+        f"""
+        SELECT
+            month,
+            COALESCE(MAX(estimate) FILTER (WHERE platform IS NULL), 0) AS total_users,
+            COALESCE(MAX(estimate) FILTER (WHERE platform = 'Facebook'), 0) AS facebook,
+            COALESCE(MAX(estimate) FILTER (WHERE platform = 'Instagram'), 0) AS instagram,
+            COALESCE(MAX(estimate) FILTER (WHERE platform = 'Twitter'), 0) AS twitter
+        FROM ({hll.distinct_query(users_source, [("month",), ("month", "platform")])})
+        GROUP BY month
+        """,
+        params=users_params,
+        arrow=True,
+    )
+    per_month = sql(
+        "SELECT * FROM per_month JOIN users_per_month USING (month)",
+        per_month=per_month,
+        users_per_month=users_per_month,
+        arrow=True,
+    )
+
 monthly = sql(
     """
     SELECT 
         username,
-        strftime(post_date, '%Y %B') AS date,
-        GROUP_CONCAT(DISTINCT platform) AS platforms,
-        SUM(likes + comments + shares) AS total_interactions
-    FROM df
-    WHERE EXTRACT(YEAR FROM post_date) = 2023
-    GROUP BY username, date, strftime(post_date, '%Y-%m')
-    HAVING COUNT(DISTINCT platform) > 0
-    ORDER BY strftime(post_date, '%Y-%m')
-    """
+        strftime(month, '%Y %B') AS date,
+        platforms,
+        total_interactions
+    FROM per_user_month
+    ORDER BY month
+    """,
+    per_user_month=monthly_2023["per_user_month"],
+    arrow=True,
 )
 
+def plot_interactions_per_month(platforms_long):
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # 4️⃣ Buat objek fig dan ax
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    # 2️⃣ Plot line chart
+    sns.lineplot(
+        data=platforms_long,
+        x='date', 
+        y='total_interactions', 
+        hue='platform', 
+        palette=['green', 'orange', 'blue'],
+        marker='o',
+        ci=None,  # Hilangkan bayangan (confidence interval)
+        ax=ax
+    )
+
+    # 3️⃣ Tampilkan semua bulan (termasuk bulan genap) di sumbu X
+    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+
+    # 4️⃣ Atur rotasi agar tidak bertumpuk
+    plt.xticks(rotation=65)
+
+    # 5️⃣ Tambahkan grid, label, dan judul
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_title('Total Interactions per Month by Platform')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Total Interactions')
+    return fig
+
 st.dataframe(monthly)
 
-# 1️⃣ Pisahkan platform (long-form)
-platforms = monthly['platforms'].str.split(',', expand=True).stack().reset_index(level=1, drop=True)
-platforms.name = 'platform'
-
-# 2️⃣ Gabungkan dengan monthly DataFrame
-platforms_long = monthly.join(platforms).reset_index()
-
-# 3️⃣ Konversi 'date' ke datetime
-platforms_long['date'] = pd.to_datetime(platforms_long['date'], format='%Y %B')
-
-# 4️⃣ Buat objek fig dan ax
-fig, ax = plt.subplots(figsize=(12, 6))
-
-# 2️⃣ Plot line chart
-sns.lineplot(
-    data=platforms_long,
-    x='date', 
-    y='total_interactions', 
-    hue='platform', 
-    palette=['green', 'orange', 'blue'],
-    marker='o',
-    ci=None,  # Hilangkan bayangan (confidence interval)
-    ax=ax
+# 1️⃣ Pisahkan platform (long-form) dan konversi 'date' ke datetime,
+# di DuckDB langsung dari tabel Arrow
+platforms_long = sql(
+    """
+    SELECT
+        username,
+        strptime(date, '%Y %B') AS date,
+        platforms,
+        total_interactions,
+        UNNEST(string_split(platforms, ',')) AS platform
+    FROM monthly
+    """,
+    monthly=monthly,
+    arrow=True,
 )
 
-# 3️⃣ Tampilkan semua bulan (termasuk bulan genap) di sumbu X
-ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-
-# 4️⃣ Atur rotasi agar tidak bertumpuk
-plt.xticks(rotation=65)
-
-# 5️⃣ Tambahkan grid, label, dan judul
-ax.grid(True, linestyle='--', alpha=0.7)
-ax.set_title('Total Interactions per Month by Platform')
-ax.set_xlabel('Date')
-ax.set_ylabel('Total Interactions')
-
-# 6️⃣ Tampilkan di Streamlit
-st.pyplot(fig)
+# 6️⃣ Tampilkan di Streamlit, dirender sekali lalu diambil dari cache
+show_figure(plot_interactions_per_month, platforms_long)
 
 monthly_users = sql(
     """
     SELECT 
-        strftime(post_date, '%Y %B') AS date,
-        COUNT(DISTINCT username) AS total_users,
-        GROUP_CONCAT(DISTINCT platform) AS platforms,
-        SUM(likes + comments + shares) AS total_interactions,
-        COUNT(DISTINCT CASE WHEN platform = 'Facebook' THEN username END) AS facebook,
-        COUNT(DISTINCT CASE WHEN platform = 'Instagram' THEN username END) AS instagram,
-        COUNT(DISTINCT CASE WHEN platform = 'Twitter' THEN username END) AS twitter
-    FROM df
-    WHERE EXTRACT(YEAR FROM post_date) = 2023
-    GROUP BY date, strftime(post_date, '%Y-%m')
-    HAVING COUNT(DISTINCT platform) > 0
-    ORDER BY strftime(post_date, '%Y-%m')
-    """
+        strftime(month, '%Y %B') AS date,
+        total_users,
+        platforms,
+        total_interactions,
+        facebook,
+        instagram,
+        twitter
+    FROM per_month
+    ORDER BY month
+    """,
+    per_month=per_month,
+    arrow=True,
 )
 
-st.dataframe(monthly_users)
+def plot_users_per_month(platforms_longlest):
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # 3️⃣ Plot line chart dengan seaborn
+    fig2, ax2 = plt.subplots(figsize=(12, 6))
+    sns.lineplot(
+        data=platforms_longlest,
+        x='date',
+        y='users_count',
+        hue='platforms',
+        palette=['blue', 'orange', 'green'],
+        marker='o'
+    )
+
+    # 4️⃣ Tambahkan label, grid, dan rotasi tanggal
+    ax2.xaxis.set_major_locator(mdates.MonthLocator(interval=1))  # Tampilkan setiap bulan
+    ax2.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))  # Format bulan singkat
+    plt.xticks(rotation=65)
+    plt.title('Total Users per Platform per Month (2023)')
+    plt.xlabel('Date')
+    plt.ylabel('Total Users')
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.legend(title='Platform')
+    return fig2
 
-# 1️⃣ Konversi 'date' ke datetime
-monthly_users['date'] = pd.to_datetime(monthly_users['date'], format='%Y %B')
-
-# 2️⃣ Ubah ke long-form agar seaborn mudah memproses
-platforms_longlest = monthly_users.melt(
-    id_vars=['date'],
-    value_vars=['facebook', 'instagram', 'twitter'],
-    var_name='platforms',
-    value_name='users_count'  # Hindari nama bentrok
-)
+st.dataframe(monthly_users)
+users_caption()
 
-# 3️⃣ Plot line chart dengan seaborn
-fig2, ax2 = plt.subplots(figsize=(12, 6))
-sns.lineplot(
-    data=platforms_longlest,
-    x='date',
-    y='users_count',
-    hue='platforms',
-    palette=['blue', 'orange', 'green'],
-    marker='o'
+# 1️⃣ Konversi 'date' ke datetime dan ubah ke long-form agar seaborn mudah memproses
+platforms_longlest = sql(
+    """
+    SELECT strptime(date, '%Y %B') AS date, platforms, users_count
+    FROM (UNPIVOT (SELECT date, facebook, instagram, twitter FROM monthly_users)
+          ON facebook, instagram, twitter INTO NAME platforms VALUE users_count)
+    """,
+    monthly_users=monthly_users,
+    arrow=True,
 )
 
-# 4️⃣ Tambahkan label, grid, dan rotasi tanggal
-ax2.xaxis.set_major_locator(mdates.MonthLocator(interval=1))  # Tampilkan setiap bulan
-ax2.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))  # Format bulan singkat
-plt.xticks(rotation=65)
-plt.title('Total Users per Platform per Month (2023)')
-plt.xlabel('Date')
-plt.ylabel('Total Users')
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.legend(title='Platform')
-
 # Tampilkan di Streamlit
-st.pyplot(fig2)
+show_figure(plot_users_per_month, platforms_longlest)
 
 
 st.markdown("""
@@ -189,42 +264,59 @@ with the table and graph below :
 </p>
 """, unsafe_allow_html=True)
 
-df['hour'] = df['post_date'].dt.hour
+hour_users, users_join, users_params = "COUNT(DISTINCT username)", "", []
+if approximate:
+    # users of every hour over the filtered months and platforms, merged
+    # from the (month, hour, platform) sketches
+    hourly_source, users_params = rollup_source('social_media_hourly_hll', year_2023)
+    hour_users = "ANY_VALUE(users.estimate)"
+    users_join = f"JOIN ({hll.distinct_query(hourly_source, [('hour',)])}) AS users ON users.hour = post_hour"
 
 per_hour = sql(
-    """
+    f"""
     SELECT 
-        COUNT(DISTINCT username) AS total_users,
+        {hour_users} AS total_users,
         ANY_VALUE(post_date) AS date,
-        hour,
+        post_hour AS hour,
         SUM(CASE WHEN platform = 'Instagram' THEN 1 ELSE 0 END) AS Instagram,
         SUM(CASE WHEN platform = 'Facebook' THEN 1 ELSE 0 END) AS Facebook,
         SUM(CASE WHEN platform = 'Twitter' THEN 1 ELSE 0 END) AS Twitter
-    FROM df
-    WHERE EXTRACT(YEAR FROM post_date) = 2023  -- Ambil data untuk tahun 2023
-    GROUP BY hour
+    FROM social_media
+    {users_join}
+    {where_2023}
+    GROUP BY post_hour
     HAVING COUNT(DISTINCT platform) > 0
     ORDER BY date
-    """
+    """,
+    params=[*users_params, *params_2023],
+    arrow=True,
 )
 
-st.dataframe(per_hour)
-
-per_hour_melted = per_hour.melt(id_vars=["hour"], value_vars=["Instagram", "Facebook", "Twitter"], var_name="platform", value_name="total_user")
+def plot_hourly_usage(per_hour_melted):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
+    fig3 = plt.figure(figsize=(12, 6))
+    sns.lineplot(data=per_hour_melted, x='hour', y='total_user', hue='platform', marker='o', ci=None)
 
+    plt.title('Hourly Platform Usage in 2023', fontsize=14)
+    plt.xlabel('Hour', fontsize=12)
+    plt.ylabel('Total Users', fontsize=12)
 
-fig3 = plt.figure(figsize=(12, 6))
-sns.lineplot(data=per_hour_melted, x='hour', y='total_user', hue='platform', marker='o', ci=None)
+    plt.xticks(range(0, 24))
+    plt.legend(title='Platform')
+    return fig3
 
-plt.title('Hourly Platform Usage in 2023', fontsize=14)
-plt.xlabel('Hour', fontsize=12)
-plt.ylabel('Total Users', fontsize=12)
+st.dataframe(per_hour)
+users_caption()
 
-plt.xticks(range(0, 24))
-plt.legend(title='Platform')
+per_hour_melted = sql(
+    "SELECT hour, platform, total_user FROM (UNPIVOT per_hour ON Instagram, Facebook, Twitter INTO NAME platform VALUE total_user)",
+    per_hour=per_hour,
+    arrow=True,
+)
 
-st.pyplot(fig3)
+show_figure(plot_hourly_usage, per_hour_melted)
 
 
 st.markdown("""
@@ -240,22 +332,20 @@ The table below can be a reference for which influencers are suitable for the pl
 determined by the company :
 """, unsafe_allow_html=True)
 
-user = sql(
-    """
-    SELECT 
-        username,
-        ANY_VALUE(post_date) as Date,
-        GROUP_CONCAT(DISTINCT platform) AS platforms,
-        SUM(likes + comments + shares) AS total_interactions
-    FROM df
-    GROUP BY username
-    HAVING COUNT (DISTINCT platform) > 0
-    ORDER BY total_interactions DESC
-    limit 10
-    """
-)
+# The ranking is answered from the top users kept in memory per month and
+# platform (utils/topk.py) when the filters cover whole months, else by SQL
+influencers_error = 0
+if filters.whole_months():
+    user, influencers_error = influencers.top(10, filters.start, filters.end, dict(filters.values).get('platform', ()))
+else:
+    user = sql(top_query(where), params=params, arrow=True)
 
 st.dataframe(user)
+if influencers_error:
+    st.caption(
+        f"Totals may be up to {influencers_error:,} interactions too high: the page keeps the "
+        f"{TOPK_CAPACITY:,} heaviest users of every month and platform."
+    )
 
 st.markdown("""
 ### Conclusion
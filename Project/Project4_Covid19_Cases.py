@@ -1,27 +1,25 @@
-import streamlit as st
-
-# Data manipulation
-import pandas as pd
-
-# Data viz
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
-import folium
+from functools import partial
 
-# SQL query
-import duckdb as db
+import streamlit as st
 
-# SQL function
-def sql(sql_query):
-    return db.sql(sql_query).to_df()
+# Shared data and SQL helpers
+from utils.downsample import downsampled_series
+from utils.figures import show_figure
+from utils.filters import require_rows, rollup_source, sidebar_filters
+from utils.maps import cases_map_html
+from utils.query import run_batch, shared_scan, sql
+from utils.sections import section
 
 # choose chart style
-import matplotlib as mpl
-mpl.style.use('ggplot')
+CHART_STYLE = 'ggplot'
 
 st.title("COVID-19 Case Distribution in Indonesia", anchor=False)
 
+# Sidebar filters, applied inside every analysis query below
+filters = sidebar_filters('covid', 'date', ('island', 'location'))
+predicate, params = filters.predicate()
+monthly_source, monthly_params = rollup_source('covid_monthly', filters)
+
 st.markdown("---")
 
 # --- BACKGROUND ---
@@ -47,64 +45,71 @@ The dataset contains COVID-19 data spanning from March 2020 to September 2022.
 """, unsafe_allow_html=True)
 
 
-df = pd.read_csv('./Assets/covid_19.csv', parse_dates=['Date'])
-
-# Change the string format of column names to make queries easier
-df.columns = (
-    df.columns.str.lower()
-    .str.replace(' ', '_')
-    .str.replace('(', '')
-    .str.replace(')', '')
-)
-
-# drop unused columns
-df = (
-    df.drop([
-        'province',
-        'country',
-        'continent',
-    ], axis= 1)
-)
-
-df = df[df['location_level']=='Province']
-
-df = df.dropna(axis=1).reset_index(drop=True)
-
 # --- Trend of New Cases per Month ---
 
 st.markdown("""
 ### Trend of New Cases per Month
 """, unsafe_allow_html=True)
 
-# create data frame of new cases per month
-new_cases_per_month_num = sql(
-    """
-    WITH monthly_cases AS (
-        SELECT 
-            DATE_TRUNC('month', date) AS month,
-            SUM(new_cases) AS total_new_cases
-        FROM df
-        GROUP BY month
-        ORDER BY month
-    )
+# The monthly totals and the per location aggregates are independent,
+# they run together on the query pool.
+# Monthly totals are materialised once per data load in covid_monthly,
+# read once here for both monthly charts. The sunburst, the map and the
+# population density chart all group by location, their aggregates come
+# from one scan of the table. Everything stays in Arrow, the charts convert
+# to pandas only when they are drawn
+results = run_batch(
+    arrow=True,
+    monthly_totals=(f"""
     SELECT 
         month,
-        total_new_cases
-    FROM monthly_cases
+        total_new_cases,
+        total_new_deaths,
+        total_new_recovered
+    FROM {monthly_source}
     ORDER BY month
-    """
+    """, monthly_params),
+    by_location=partial(
+        shared_scan,
+        "covid",
+        groupings={
+            "per_island_location": ("island", "location"),
+            "per_location": ("location",),
+        },
+        measures=(
+            ("total_new_cases", "SUM(new_cases)"),
+            ("total_cases", "MAX(total_cases)"),
+            ("latitude", "AVG(latitude)"),
+            ("longitude", "AVG(longitude)"),
+            ("population_density", "AVG(population_density)"),
+        ),
+        where=predicate,
+        params=params,
+        arrow=True,
+    ),
 )
 
+# create data frame of new cases per month
+monthly_totals = results["monthly_totals"]
+require_rows(monthly_totals)
+by_location = results["by_location"]
+
+new_cases_per_month_num = monthly_totals.select(['month', 'total_new_cases'])
+
 new_cases_per_month_name = sql(
     """
     SELECT 
         STRFTIME(month, '%b %Y') AS month_year,
         total_new_cases,
     FROM new_cases_per_month_num
-    """
+    """,
+    new_cases_per_month_num=new_cases_per_month_num,
+    arrow=True,
 )
 
-def plot_new_cases_per_month():
+def plot_new_cases_per_month(new_cases_per_month_name):
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(12, 6))
 
     ax.plot(new_cases_per_month_name['month_year'], new_cases_per_month_name['total_new_cases'],
@@ -141,9 +146,10 @@ def plot_new_cases_per_month():
                  ha='left',
                  fontsize=11)
 
-    st.pyplot(fig)
+    return fig
 
-plot_new_cases_per_month()
+# Rendered once per data version, then served from the image cache
+show_figure(plot_new_cases_per_month, new_cases_per_month_name, style=CHART_STYLE)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -178,18 +184,7 @@ st.markdown("""
 ### Total New Cases vs New Deaths vs New Recovered per Month
 """, unsafe_allow_html=True)
 
-compare_trend_num = sql(
-    """
-    SELECT 
-        DATE_TRUNC('month', date) AS month,
-        SUM(new_cases) AS total_new_cases,
-        SUM(new_deaths) AS total_new_deaths,
-        SUM(new_recovered) AS total_new_recovered
-    FROM df
-    GROUP BY month
-    ORDER BY month
-    """
-)
+compare_trend_num = monthly_totals
 
 compare_trend_name = sql(
     """
@@ -199,24 +194,31 @@ compare_trend_name = sql(
         total_new_deaths,
         total_new_recovered
     FROM compare_trend_num
-    """
+    """,
+    compare_trend_num=compare_trend_num,
+    arrow=True,
 )
 
-fig, ax = plt.subplots(figsize= (12, 6))
+def plot_compare_trend(compare_trend_name):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize= (12, 6))
+
+    ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_cases'], label= 'Total New Cases')
+    ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_deaths'], label= 'Total New Deaths')
+    ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_recovered'], label= 'Total New Recovered')
 
-ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_cases'], label= 'Total New Cases')
-ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_deaths'], label= 'Total New Deaths')
-ax.plot(compare_trend_name['month_year'], compare_trend_name['total_new_recovered'], label= 'Total New Recovered')
+    ax.set_xlabel('')
+    ax.set_ylabel('')
+    ax.set_title('Total New Cases vs New Deaths vs New Recovered per Month')
+    ax.legend()
 
-ax.set_xlabel('')
-ax.set_ylabel('')
-ax.set_title('Total New Cases vs New Deaths vs New Recovered per Month')
-ax.legend()
+    plt.xticks(rotation= 65)
+    ax.ticklabel_format(axis= 'y', style= 'plain', useOffset= False)
+    ax.yaxis.set_major_locator(plt.MultipleLocator(100000))
+    return fig
 
-plt.xticks(rotation= 65)
-ax.ticklabel_format(axis= 'y', style= 'plain', useOffset= False)
-ax.yaxis.set_major_locator(plt.MultipleLocator(100000))
-st.pyplot(fig)
+show_figure(plot_compare_trend, compare_trend_name, style=CHART_STYLE)
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
@@ -229,6 +231,49 @@ pronounced compared to the increase in cases. This could potentially be attribut
 </p>
 """, unsafe_allow_html=True)
 
+st.markdown("""
+### Daily New Cases per Province
+""", unsafe_allow_html=True)
+
+# Sections with widgets of their own are fragments (see utils/sections.py),
+# moving the window or switching the layer reruns only them
+@section
+def daily_cases_section():
+    import datetime as dt
+
+    import plotly.express as px
+
+    bounds = sql(
+        f"SELECT MIN(date) AS low, MAX(date) AS high FROM covid {'WHERE ' + predicate if predicate else ''}",
+        params=params,
+    )
+    low, high = bounds["low"].iloc[0].date(), bounds["high"].iloc[0].date()
+
+    # Narrowing the window spreads the same number of points over fewer days,
+    # only this section reruns
+    start, end = st.slider(
+        "Window", min_value=low, max_value=high, value=(low, high), format="MMM YYYY",
+        key=f"covid_daily_window_{low}_{high}",
+    )
+    window = " AND ".join(filter(None, [predicate, "date >= ? AND date < ?"]))
+
+    # Each province is reduced to about one point per pixel on the server,
+    # the spikes are kept (see utils/downsample.py)
+    daily, raw_points = downsampled_series(
+        "covid", "date_trunc('day', date)", "SUM(new_cases)", "location",
+        where=window, params=[*params, start, end + dt.timedelta(days=1)],
+    )
+
+    fig = px.line(
+        daily, x='x', y='y', color='series',
+        labels={'x': 'Date', 'y': 'New Cases', 'series': 'Province'},
+        title='Daily New Cases per Province',
+    )
+    st.plotly_chart(fig, width="stretch")
+    st.caption(f"{len(daily):,} of {raw_points:,} daily points drawn")
+
+daily_cases_section()
+
 st.markdown("""
 ### Distribution of COVID-19 Cases in Indonesia by Location
 """, unsafe_allow_html=True)
@@ -238,13 +283,16 @@ new_cases_by_location = sql(
     SELECT 
         island,
         location,
-        SUM(new_cases) AS total_new_cases
-    FROM df
-    GROUP BY island, location
+        total_new_cases
+    FROM per_island_location
     ORDER BY island, location
-    """
+    """,
+    per_island_location=by_location["per_island_location"],
+    arrow=True,
 )
 
+import plotly.express as px
+
 fig = px.sunburst(
     new_cases_by_location,
     path=['island', 'location'], 
@@ -273,34 +321,18 @@ To see the distribution of cases in Indonesia, we can make a map by utilizing th
 </p>
 """, unsafe_allow_html=True)
 
-geo_data = sql(
-    """
-    SELECT
-        location,
-        MAX(total_cases) AS total_cases,
-        AVG(latitude) AS latitude,
-        AVG(longitude) AS longitude
-    FROM df
-    GROUP BY location;
-    """
-)
+geo_data = by_location["per_location"].select(['location', 'total_cases', 'latitude', 'longitude'])
 
-m = folium.Map(location=[geo_data['latitude'].mean(), geo_data['longitude'].mean()], zoom_start=5)
+@section
+def map_section():
+    # Changing the layer reruns only this section
+    layer = st.radio("Layer", ["auto", "circles", "geojson"], horizontal=True, key="covid_map_layer")
 
-# Add markers for each province
+    # Map with a marker for each province, built once per data version
+    map_html = cases_map_html(geo_data, layer)
+    st.components.v1.html(map_html, height=500)
 
-for i, row in geo_data.iterrows():
-    folium.Circle(
-        location=[row['latitude'], row['longitude']],
-        radius=row['total_cases']/5 ,  
-        color='crimson',  
-        fill=True,
-        fill_color='crimson',  
-        tooltip=f"{row['location']}: {row['total_cases']} cases",  
-    ).add_to(m)
-
-map_html = m._repr_html_()
-st.components.v1.html(map_html, height=500)
+map_section()
 
 st.markdown("""
 ### Total Cases vs Population Density
@@ -310,29 +342,33 @@ cases_vs_popdens = sql(
     """
     SELECT 
         location,
-        MAX(total_cases) total_cases,
-        AVG(population_density) as population_density
-    FROM df
-    GROUP BY location
+        total_cases,
+        population_density
+    FROM per_location
     ORDER BY total_cases DESC
-    """
+    """,
+    per_location=by_location["per_location"],
+    arrow=True,
 )
 
-plt.style.use('default')
+def plot_cases_vs_popdens(cases_vs_popdens):
+    import matplotlib.pyplot as plt
+
+    fig, ax1 = plt.subplots(figsize=(12, 6))
 
-fig, ax1 = plt.subplots(figsize=(12, 6))
+    ax1.bar(cases_vs_popdens['location'], cases_vs_popdens['total_cases'])
+    ax1.set_xlabel('')
+    ax1.set_ylabel('Total Cases')   
+    ax1.tick_params(axis='x', rotation=90)
 
-ax1.bar(cases_vs_popdens['location'], cases_vs_popdens['total_cases'])
-ax1.set_xlabel('')
-ax1.set_ylabel('Total Cases')   
-ax1.tick_params(axis='x', rotation=90)
+    ax2 = ax1.twinx()
+    ax2.plot(cases_vs_popdens['location'], cases_vs_popdens['population_density'], color='r', marker='o')
+    ax2.set_ylabel('Average Population Density')
 
-ax2 = ax1.twinx()
-ax2.plot(cases_vs_popdens['location'], cases_vs_popdens['population_density'], color='r', marker='o')
-ax2.set_ylabel('Average Population Density')
+    plt.title('Comparison of Total Cases and Population Density per Province')
+    return fig
 
-plt.title('Comparison of Total Cases and Population Density per Province')
-st.pyplot(fig)
+show_figure(plot_cases_vs_popdens, cases_vs_popdens, style='default')
 
 st.markdown("""
 <p style='text-align: justify; padding: 1px;'>
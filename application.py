@@ -1,5 +1,7 @@
 import streamlit as st
 
+from utils.debug_panel import debug_controls, debug_report
+
 st.set_page_config(layout="wide")
 
 #Page Setup
@@ -55,4 +57,9 @@ st.sidebar.markdown("""
 
     """, unsafe_allow_html=True)
 
-pg.run()
\ No newline at end of file
+# Opt-in tracing panel, see utils/tracing.py
+trace_run = debug_controls()
+
+pg.run()
+
+debug_report(trace_run)
@@ -0,0 +1,142 @@
+"""Import time report for the app pages, run after dependency or page changes.
+
+Every measurement runs in a fresh interpreter with streamlit already
+imported, which is what a page sees right after a server restart. The
+report shows the cost of each heavy library and of the module level
+imports of every page; a page whose imports before its first rendered
+element go over budget makes the run fail.
+
+Usage:
+    python benchmarks/import_budget.py            # report and check budgets
+    python benchmarks/import_budget.py --update   # write current numbers as budgets
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_FILE = Path(__file__).resolve().parent / "import_budget.json"
+
+# Libraries the pages use, measured one by one
+MODULES = [
+    "pandas",
+    "numpy",
+    "duckdb",
+    "pyarrow",
+    "matplotlib.pyplot",
+    "seaborn",
+    "plotly.graph_objs",
+    "plotly.express",
+    "sklearn.linear_model",
+    "scipy.stats",
+    "folium",
+]
+
+# Headroom over the measured numbers when writing budgets
+HEADROOM = 1.5
+
+_TIMER = """
+import sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def time_code(code, repeat=3):
+    """Best of ``repeat`` cold runs of ``code``, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(root=str(ROOT), code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        timings.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return min(timings)
+
+
+def page_imports(path, first_paint=False):
+    """Source of the module level import statements of a page.
+
+    With ``first_paint`` only the imports that run before the first
+    rendering statement are kept, the ones delaying anything on screen.
+    """
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    imports = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(ast.unparse(node))
+        elif first_paint and isinstance(node, ast.Expr):
+            break
+    return "\n".join(imports)
+
+
+def app_pages():
+    """Page files registered with st.Page in application.py."""
+    tree = ast.parse((ROOT / "application.py").read_text(encoding="utf-8"))
+    pages = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, "attr", None) == "Page":
+            for keyword in node.keywords:
+                if keyword.arg == "page":
+                    pages.append(keyword.value.value)
+            if node.args:
+                pages.append(node.args[0].value)
+    return pages
+
+
+def measure(repeat=3):
+    report = {"modules": {}, "pages": {}}
+    for module in MODULES:
+        try:
+            report["modules"][module] = round(time_code(f"import {module}", repeat), 1)
+        except subprocess.CalledProcessError:
+            report["modules"][module] = None
+    for page in app_pages():
+        report["pages"][page] = {
+            "first_paint": round(time_code(page_imports(ROOT / page, first_paint=True), repeat), 1),
+            "total": round(time_code(page_imports(ROOT / page), repeat), 1),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-module and per-page import time budget.")
+    parser.add_argument("--update", action="store_true", help="store the current numbers as the budget")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    report = measure(args.repeat)
+
+    print("module import cost (ms, on top of streamlit)")
+    for module, ms in sorted(report["modules"].items(), key=lambda item: -(item[1] or 0)):
+        print(f"  {module:<24} {'not installed' if ms is None else f'{ms:8.1f}'}")
+
+    budgets = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+    failed = []
+    print("page module level imports (ms)      before first paint     whole page")
+    for page, cost in report["pages"].items():
+        budget = budgets.get(page)
+        status = ""
+        if budget is not None:
+            status = f"budget {budget:.1f}"
+            if cost["first_paint"] > budget:
+                status += "  OVER BUDGET"
+                failed.append(page)
+        print(f"  {page:<45} {cost['first_paint']:8.1f} {cost['total']:8.1f}  {status}")
+
+    if args.update:
+        budgets = {page: round(max(cost["first_paint"] * HEADROOM, 50.0), 1) for page, cost in report["pages"].items()}
+        BUDGET_FILE.write_text(json.dumps(budgets, indent=2) + "\n")
+        print(f"budgets written to {BUDGET_FILE}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
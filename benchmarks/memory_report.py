@@ -0,0 +1,79 @@
+"""Memory held by the datasets, before and after the compact encoding.
+
+"Before" is the raw csv as the pages used to hold it, read by pandas
+without any typing. "After" is what the pages read now: the DuckDB table
+of the dataset with its rollups, loaded with and without the checkpoint
+that compresses them, next to the size of the typed parquet copy when
+there is one.
+
+Usage:
+    python benchmarks/memory_report.py --scale 50
+    python benchmarks/memory_report.py --rows 10M
+"""
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from import_budget import ROOT
+
+
+def mb(value):
+    return f"{value / 1024 / 1024:8.2f} MB" if value is not None else f"{'-':>11}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory of the datasets before and after typing.")
+    parser.add_argument("--scale", type=int, default=1, help="repeat the rows of every dataset this many times")
+    parser.add_argument("--rows", default=None, help="use N synthetic rows per dataset (e.g. 10M) instead of --scale")
+    args = parser.parse_args(argv)
+
+    if args.rows:
+        from render_pages import synthetic_copies
+
+        workdir = Path(tempfile.mkdtemp(prefix="portfolio-memory-"))
+        synthetic_copies(workdir, args.rows)
+        os.environ["PORTFOLIO_DATA_DIR"] = str(workdir)
+        os.environ["PORTFOLIO_PARQUET_DIR"] = str(workdir / "parquet")
+    elif args.scale > 1:
+        from render_pages import scale_copies
+
+        workdir = Path(tempfile.mkdtemp(prefix="portfolio-memory-"))
+        scale_copies(workdir, args.scale)
+        os.environ["PORTFOLIO_DATA_DIR"] = str(workdir)
+        os.environ["PORTFOLIO_PARQUET_DIR"] = str(workdir / "parquet")
+    # dataset paths are relative to the repository root
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    import pandas as pd
+
+    from utils.datasets import DATASETS
+    from utils.query import QueryEngine
+
+    names = [name for name, spec in DATASETS.items() if spec.path.exists()]
+
+    def engine_bytes(compress, name=None):
+        engine = QueryEngine(":memory:", compress=compress)
+        if name is not None:
+            engine.ensure_table(name)
+        return sum(engine.memory_usage().values())
+
+    # what an engine holds before any dataset is loaded
+    empty = {compress: engine_bytes(compress) for compress in (False, True)}
+
+    print(f"{'dataset':<14} {'rows':>11} {'csv file':>11} {'csv pandas':>11} {'duckdb':>11} {'compressed':>11} {'parquet':>11}")
+    for name in names:
+        spec = DATASETS[name]
+        raw = pd.read_csv(spec.path)
+        duckdb_bytes = {compress: engine_bytes(compress, name) - empty[compress] for compress in (False, True)}
+        parquet = spec.parquet_path.stat().st_size if spec.parquet_path.exists() else None
+        print(
+            f"{name:<14} {len(raw):>11,} {mb(spec.path.stat().st_size)} {mb(int(raw.memory_usage(deep=True).sum()))}"
+            f" {mb(duckdb_bytes[False])} {mb(duckdb_bytes[True])} {mb(parquet)}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
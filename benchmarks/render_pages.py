@@ -0,0 +1,282 @@
+"""Headless render benchmark of every page registered in application.py.
+
+Each page is run with Streamlit's app testing API against scaled up
+copies of the Assets datasets (or seeded synthetic data of a given size,
+see utils/synthetic.py), once cold (empty caches, tables reloaded)
+and once warm (a rerun of the same session). Wall time is split into
+data load, SQL, chart construction and serialisation (marshalling the
+elements sent to the browser); the rest is reported as "other".
+
+Results are written as JSON and compared with the stored baseline, a
+page slower than the baseline by more than the tolerance fails the run.
+
+Usage:
+    python benchmarks/render_pages.py --scale 10
+    python benchmarks/render_pages.py --scale 10 --update-baseline
+    python benchmarks/render_pages.py --rows 1M
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from import_budget import ROOT, app_pages
+
+BASELINE_FILE = Path(__file__).resolve().parent / "render_baseline.json"
+PHASES = ("data_load", "sql", "chart", "serialise")
+
+
+# Synthetic rows per unit of scale for a dataset missing from Assets
+MISSING_ROWS = 1000
+
+
+def dataset_files():
+    """Csv file name of every dataset, read in a separate process (see synthetic_copies)."""
+    out = subprocess.run(
+        [sys.executable, "-c", "import json; from utils.datasets import DATASETS; "
+         "print(json.dumps({name: spec.filename for name, spec in DATASETS.items()}))"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def scale_copies(target, scale):
+    """Copy every dataset csv of Assets to ``target`` with its rows repeated ``scale`` times.
+
+    A dataset the checkout does not have (covid_19.csv is not shipped) is
+    generated with utils/synthetic.py instead, ``MISSING_ROWS`` rows per
+    unit of scale, so every page always has its data.
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    missing = []
+    for name, filename in dataset_files().items():
+        source = ROOT / "Assets" / filename
+        if not source.exists():
+            missing.append(name)
+            continue
+        with open(source, encoding="utf-8") as handle:
+            header = handle.readline()
+            body = handle.read()
+        if body and not body.endswith("\n"):
+            body += "\n"
+        with open(target / source.name, "w", encoding="utf-8") as out:
+            out.write(header)
+            for _ in range(scale):
+                out.write(body)
+    if missing:
+        subprocess.run(
+            [sys.executable, "-m", "utils.synthetic", *missing, "--rows", str(MISSING_ROWS * scale), "--out", str(target)],
+            cwd=ROOT,
+            check=True,
+        )
+
+
+def synthetic_copies(target, rows):
+    """Write ``rows`` seeded synthetic rows of every dataset to ``target``.
+
+    Runs in its own process, utils.datasets reads the data folder when it
+    is first imported and the benchmark sets it afterwards.
+    """
+    subprocess.run(
+        [sys.executable, "-m", "utils.synthetic", "--rows", str(rows), "--out", str(target)],
+        cwd=ROOT,
+        check=True,
+    )
+
+
+class PhaseTimer:
+    """Exclusive time per phase, nested phases are not counted twice."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            self.totals[name] += elapsed - children
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def wrap(self, owner, attribute, name):
+        original = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return original(*args, **kwargs)
+
+        setattr(owner, attribute, timed)
+
+    def reset(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+
+def instrument(timer):
+    import matplotlib.figure
+    import streamlit as st
+    import streamlit.components.v1 as components
+
+    from utils import figures, maps, query
+
+    timer.wrap(query.QueryEngine, "ensure_table", "data_load")
+    timer.wrap(query.QueryEngine, "_execute", "sql")
+    timer.wrap(figures, "render_figure", "chart")
+    timer.wrap(maps, "build_cases_map", "chart")
+    timer.wrap(matplotlib.figure.Figure, "savefig", "serialise")
+    for element in ("dataframe", "plotly_chart", "image", "pyplot", "table"):
+        timer.wrap(st, element, "serialise")
+    timer.wrap(components, "html", "serialise")
+
+
+def clear_caches():
+    from utils import figures, maps, query
+
+    query.engine.reset()
+    figures.clear_figure_cache()
+    maps.clear_map_cache()
+
+
+def breakdown(timer, wall):
+    result = {"total": round(wall * 1000, 1)}
+    for name in PHASES:
+        result[name] = round(timer.totals[name] * 1000, 1)
+    result["other"] = round(max(result["total"] - sum(result[name] for name in PHASES), 0.0), 1)
+    return result
+
+
+def run_page(page, timer, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(ROOT / page), default_timeout=timeout)
+    clear_caches()
+    runs = {}
+    for label in ("cold", "warm"):
+        timer.reset()
+        start = time.perf_counter()
+        app.run()
+        wall = time.perf_counter() - start
+        if app.exception:
+            return {"error": app.exception[0].value}
+        runs[label] = breakdown(timer, wall)
+    return runs
+
+
+def best_of(results):
+    """Fastest repeat per page and phase, the least noisy number."""
+    best = {}
+    for result in results:
+        for label, phases in result.items():
+            if label not in best or phases["total"] < best[label]["total"]:
+                best[label] = phases
+    return best
+
+
+def compare(report, baseline, tolerance, slack_ms):
+    failures = []
+    for page, runs in report["pages"].items():
+        for label, phases in runs.items():
+            expected = baseline.get("pages", {}).get(page, {}).get(label)
+            if not isinstance(phases, dict) or not expected or "total" not in phases:
+                continue
+            limit = expected["total"] * tolerance + slack_ms
+            if phases["total"] > limit:
+                failures.append(f"{page} ({label}): {phases['total']:.1f} ms > {limit:.1f} ms")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every page headlessly and time it.")
+    parser.add_argument("--scale", type=int, default=10, help="repeat the rows of every dataset this many times")
+    parser.add_argument("--rows", default=None, help="use N synthetic rows per dataset (e.g. 1M) instead of --scale")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path(__file__).resolve().parent / "render_results.json")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="allowed slowdown factor over the baseline")
+    parser.add_argument("--slack-ms", type=float, default=100.0, help="allowed absolute slowdown")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="portfolio-bench-"))
+    if args.rows:
+        synthetic_copies(workdir / "data", args.rows)
+    else:
+        scale_copies(workdir / "data", args.scale)
+    # the shared helpers read these when they are first imported
+    os.environ["PORTFOLIO_DATA_DIR"] = str(workdir / "data")
+    os.environ["PORTFOLIO_PARQUET_DIR"] = str(workdir / "parquet")
+    os.environ["PORTFOLIO_CACHE_DIR"] = str(workdir / "cache")
+    os.environ.pop("PORTFOLIO_DUCKDB_PATH", None)
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+
+    timer = PhaseTimer()
+    instrument(timer)
+
+    report = {
+        "scale": None if args.rows else args.scale,
+        "rows": args.rows,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "pages": {},
+    }
+    for page in app_pages():
+        results = []
+        for _ in range(args.repeat):
+            result = run_page(page, timer, args.timeout)
+            if "error" in result:
+                report["pages"][page] = result
+                break
+            results.append(result)
+        else:
+            report["pages"][page] = best_of(results)
+
+        runs = report["pages"][page]
+        if "error" in runs:
+            print(f"{page}: failed: {runs['error']}")
+            continue
+        for label, phases in runs.items():
+            detail = "  ".join(f"{name} {phases[name]:.1f}" for name in (*PHASES, "other"))
+            print(f"{page:<45} {label:<5} {phases['total']:9.1f} ms   {detail}")
+
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {args.output}")
+
+    # a page that does not render is a failure, and never a baseline
+    errors = [f"{page}: {runs['error']}" for page, runs in report["pages"].items() if "error" in runs]
+    for error in errors:
+        print(f"FAILED: {error}")
+    if errors:
+        return 1
+
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {BASELINE_FILE}")
+        return 0
+
+    if not BASELINE_FILE.exists():
+        print("no baseline yet, run with --update-baseline to create one")
+        return 0
+    baseline = json.loads(BASELINE_FILE.read_text())
+    if (baseline.get("scale"), baseline.get("rows")) != (report["scale"], report["rows"]):
+        print(f"baseline was recorded at scale {baseline.get('scale')}, rows {baseline.get('rows')}, not comparing")
+        return 0
+    failures = compare(report, baseline, args.tolerance, args.slack_ms)
+    for failure in failures:
+        print(f"SLOWER THAN BASELINE: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
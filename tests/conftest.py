@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the tests import the app's utils package from the repository root and
+# read the datasets of Assets wherever pytest is started from
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("PORTFOLIO_DATA_DIR", str(ROOT / "Assets"))
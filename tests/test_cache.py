@@ -0,0 +1,18 @@
+import pyarrow as pa
+
+from utils.cache import fingerprint
+
+
+def test_dictionary_columns_hash_their_dictionary():
+    first = pa.table({"c": pa.DictionaryArray.from_arrays([0, 1], ["a", "b"])})
+    second = pa.table({"c": pa.DictionaryArray.from_arrays([0, 1], ["c", "d"])})
+    assert fingerprint(first) != fingerprint(second)
+    assert fingerprint(first) == fingerprint(pa.table({"c": pa.DictionaryArray.from_arrays([0, 1], ["a", "b"])}))
+
+
+def test_nested_dictionary_columns_hash_their_dictionary():
+    def table(words):
+        values = pa.DictionaryArray.from_arrays([0, 1], words)
+        return pa.table({"c": pa.ListArray.from_arrays([0, 1, 2], values)})
+
+    assert fingerprint(table(["a", "b"])) != fingerprint(table(["c", "d"]))
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from utils.downsample import lttb, minmax_lttb
+
+
+@pytest.mark.parametrize("reduce", [lttb, minmax_lttb])
+@pytest.mark.parametrize("n_out", [3, 50, 400])
+def test_global_extremes_are_kept(reduce, n_out):
+    for seed in range(20):
+        rng = np.random.default_rng(seed)
+        y = np.cumsum(rng.normal(size=5_000))
+        x = np.arange(len(y))
+
+        kept = reduce(x, y, n_out)
+
+        assert np.argmin(y) in kept and np.argmax(y) in kept
+        assert kept[0] == 0 and kept[-1] == len(y) - 1
+        assert len(kept) <= n_out + 1
+        assert (np.diff(kept) > 0).all()
+
+
+def test_short_series_are_left_whole():
+    assert lttb(np.arange(10), np.arange(10.0), 20).tolist() == list(range(10))
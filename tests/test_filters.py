@@ -0,0 +1,16 @@
+import datetime as dt
+
+from utils.filters import Filters
+
+
+def test_within_narrows_only_the_dates():
+    filters = Filters("post_date", end=dt.date(2023, 6, 30), values=(("platform", ("Twitter",)),))
+    year = filters.within(dt.date(2023, 1, 1), dt.date(2023, 12, 31))
+    assert (year.start, year.end, year.values) == (dt.date(2023, 1, 1), dt.date(2023, 6, 30), filters.values)
+    assert filters.start is None
+
+
+def test_predicate_binds_an_inclusive_end():
+    condition, params = Filters("d", start=dt.date(2023, 1, 1), end=dt.date(2023, 1, 31)).predicate()
+    assert condition == '"d" >= ? AND "d" < ?'
+    assert params == [dt.date(2023, 1, 1), dt.date(2023, 2, 1)]
@@ -0,0 +1,50 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import f_oneway
+
+from utils.group_stats import anova, stats_query
+
+
+@pytest.fixture
+def orders():
+    rng = np.random.default_rng(7)
+    n = 600
+    frame = pd.DataFrame({
+        "category": rng.choice(["Books", "Clothing", "Electronics", "Toys"], n),
+        "payment": rng.choice(["Cash", "Credit Card", "PayPal"], n),
+        "delay": rng.poisson(2.0, n).astype(float),
+        "value": rng.lognormal(4.0, 0.5, n),
+    })
+    # electronics ship a day later, missing values drop out of their test only
+    frame.loc[frame["category"] == "Electronics", "delay"] += 1
+    frame.loc[::17, "value"] = None
+    frame.loc[::23, "payment"] = None
+    return frame
+
+
+def test_anova_matches_scipy(orders):
+    measures, dimensions = ("delay", "value"), ("category", "payment")
+    con = duckdb.connect()
+    con.register("orders", orders)
+    stats = con.execute(stats_query("orders", measures, dimensions)).to_arrow_table()
+
+    result = anova(stats, measures, dimensions).to_pylist()
+
+    assert len(result) == len(measures) * len(dimensions)
+    for row in result:
+        present = orders.dropna(subset=[row["measure"], row["dimension"]])
+        groups = [part[row["measure"]].to_numpy() for _, part in present.groupby(row["dimension"])]
+        expected = f_oneway(*groups)
+        assert row["groups"] == len(groups)
+        assert row["df_within"] == len(present) - len(groups)
+        assert row["F"] == pytest.approx(expected.statistic, rel=1e-9)
+        assert row["p_value"] == pytest.approx(expected.pvalue, rel=1e-6, abs=1e-300)
+
+
+def test_a_single_group_has_no_statistic():
+    stats = pd.DataFrame({"dimension": ["category"], "level": ["Books"], "delay_n": [5], "delay_mean": [1.0], "delay_ss": [2.0]})
+    row = anova(stats, ("delay",), ("category",)).to_pylist()[0]
+    assert row["groups"] == 1
+    assert row["F"] is None and row["p_value"] is None
@@ -0,0 +1,36 @@
+import duckdb
+import pytest
+
+from utils import hll
+
+
+@pytest.fixture
+def sketches():
+    con = duckdb.connect()
+    # groups of very different sizes, overlapping so the union is not their sum
+    con.execute("""
+        CREATE TABLE posts AS
+        SELECT 'small' AS g, 'user' || i AS username FROM range(300) t(i)
+        UNION ALL SELECT 'mid', 'user' || i FROM range(100, 20100) t(i)
+        UNION ALL SELECT 'large', 'user' || (i % 250000) FROM range(600000) t(i)
+    """)
+    con.execute(f"""
+        CREATE TABLE sketch AS
+        SELECT g, {hll.register_sql('username')} AS register, MAX({hll.rho_sql('username')}) AS rho
+        FROM posts GROUP BY ALL
+    """)
+    return con
+
+
+def test_estimates_within_the_error_bound(sketches):
+    exact = dict(sketches.execute("SELECT g, COUNT(DISTINCT username) FROM posts GROUP BY g").fetchall())
+    exact[None] = sketches.execute("SELECT COUNT(DISTINCT username) FROM posts").fetchone()[0]
+    estimates = {
+        g: estimate
+        for g, _, estimate in sketches.execute(hll.distinct_query("sketch", [("g",), ()])).fetchall()
+    }
+
+    assert estimates.keys() == exact.keys()
+    for g, count in exact.items():
+        # three standard errors
+        assert abs(estimates[g] - count) <= 3 * hll.relative_error() * count, g
@@ -0,0 +1,24 @@
+import pyarrow as pa
+
+from utils.query import sql
+
+
+def test_arrow_results_hold_the_values_of_the_dataframe_path():
+    query = """
+        SELECT Category, Order_ID, SUM(Quantity) AS quantity, AVG(Price) AS price
+        FROM ecommerce GROUP BY ALL ORDER BY Order_ID LIMIT 50
+    """
+    table = sql(query, arrow=True)
+    frame = sql(query)
+
+    assert isinstance(table, pa.Table)
+    # UUIDs come back as text and integer sums as int64 on both paths
+    assert table.schema.field("Order_ID").type == pa.string()
+    assert table.schema.field("quantity").type == pa.int64()
+    assert table.to_pandas().equals(frame)
+
+
+def test_cached_arrow_results_are_not_copied():
+    query = "SELECT platform, COUNT(*) AS posts FROM social_media GROUP BY platform ORDER BY platform"
+    assert sql(query, arrow=True) is sql(query, arrow=True)
+    assert sql(query) is not sql(query)
@@ -0,0 +1,25 @@
+import datetime as dt
+
+import pytest
+
+from utils.filters import Filters
+from utils.query import sql
+from utils.topk import influencers, top_query
+
+
+@pytest.mark.parametrize("start, end, platforms", [
+    (None, None, ()),
+    (dt.date(2023, 3, 1), dt.date(2023, 6, 30), ()),
+    (dt.date(2023, 1, 1), dt.date(2023, 9, 30), ("Instagram",)),
+    (None, dt.date(2023, 2, 28), ("Facebook", "Twitter")),
+])
+def test_memory_and_sql_rankings_match(start, end, platforms):
+    filters = Filters("post_date", start, end, (("platform", platforms),))
+    assert filters.whole_months()
+    where, params = filters.where()
+
+    memory, error = influencers.top(10, start, end, platforms)
+    exact = sql(top_query(where), params=params, arrow=True)
+
+    assert error == 0
+    assert memory.to_pylist() == exact.to_pylist()
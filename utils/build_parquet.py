@@ -0,0 +1,58 @@
+"""Convert the csv datasets into typed parquet files.
+
+Usage: python -m utils.build_parquet [dataset ...]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import duckdb
+
+from utils.datasets import DATASETS, PARQUET_DIR
+from utils.ingest import _literal, configure, ingest, quote, source_query
+
+
+def build(name, scan=None, target=None):
+    """Stream the csv of ``name`` through DuckDB into its parquet file.
+
+    ``scan`` reads the raw rows from another relation than the csv (see
+    utils.ingest.source_query), ``target`` overrides the parquet path.
+    """
+    spec = DATASETS[name]
+    target = Path(target) if target else spec.parquet_path
+    con = duckdb.connect()
+    configure(con)
+    if spec.drop_null_columns:
+        # which columns survive is only known once every row has been seen
+        relation = quote(ingest(con, name, table="staging", path=spec.path, scan=scan))
+    else:
+        relation = f"({source_query(con, spec, spec.path, scan)})"
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # write next to the target first so pages never read a half written file
+    tmp_path = target.with_suffix(".parquet.tmp")
+    con.execute(f"COPY {relation} TO {_literal(tmp_path)} (FORMAT parquet)")
+    tmp_path.replace(target)
+    rows = con.execute(f"SELECT COUNT(*) FROM read_parquet({_literal(target)})").fetchone()[0]
+    con.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Assets/*.csv to parquet.")
+    parser.add_argument("datasets", nargs="*", help=f"any of {', '.join(DATASETS)} (default: every dataset with a csv)")
+    args = parser.parse_args(argv)
+    unknown = set(args.datasets) - set(DATASETS)
+    if unknown:
+        parser.error(f"unknown dataset: {', '.join(sorted(unknown))}")
+
+    names = args.datasets or [name for name, spec in DATASETS.items() if spec.path.exists()]
+    for name in names:
+        start = time.perf_counter()
+        rows = build(name)
+        print(f"{name}: {rows} rows -> {DATASETS[name].parquet_path} ({time.perf_counter() - start:.2f}s)")
+    print(f"parquet files written to {PARQUET_DIR}")
+
+
+if __name__ == "__main__":
+    main()
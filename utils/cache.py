@@ -0,0 +1,194 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def sizeof(value):
+    """Best effort size in bytes of a cached value."""
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+def fingerprint(*values):
+    """Stable digest of DataFrames, Arrow tables, arrays and plain python values."""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        if hasattr(value, "columns") and hasattr(value, "index"):
+            import pandas as pd
+
+            digest.update(repr(list(value.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        elif hasattr(value, "schema") and hasattr(value, "num_rows"):
+            # Arrow tables are hashed from their buffers, without a pandas copy
+            digest.update(str(value.schema).encode())
+            for column in value.columns:
+                for chunk in getattr(column, "chunks", [column]):
+                    _update_array(digest, chunk)
+        elif hasattr(value, "tobytes") and value.dtype != object:
+            digest.update(repr((value.dtype, value.shape)).encode())
+            digest.update(value.tobytes())
+        elif hasattr(value, "to_numpy"):
+            import pandas as pd
+
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        else:
+            digest.update(repr(value).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def code_identity(*funcs):
+    """Name and digest of the code of ``funcs``, it changes whenever one of them is edited."""
+    digest = hashlib.blake2b(digest_size=8)
+    for func in funcs:
+        _update_code(digest, func.__code__)
+    return f"{','.join(f'{func.__module__}.{func.__qualname__}' for func in funcs)}:{digest.hexdigest()}"
+
+
+def _update_code(digest, code):
+    digest.update(code.co_code)
+    for const in code.co_consts:
+        # nested functions and lambdas are hashed by their code, their
+        # repr holds an address that changes with every process
+        if hasattr(const, "co_code"):
+            _update_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+
+
+def _update_array(digest, array):
+    """Feed the buffers of an Arrow array to ``digest``, dictionaries included."""
+    digest.update(repr((array.offset, len(array))).encode())
+    for buffer in array.buffers():
+        if buffer is not None:
+            digest.update(buffer)
+    # buffers() holds the indices of a dictionary array but not its
+    # dictionary, which may sit in a child of a nested column too
+    for dictionary in _dictionaries(array):
+        _update_array(digest, dictionary)
+
+
+def _dictionaries(array):
+    import pyarrow as pa
+
+    kind = array.type
+    if pa.types.is_dictionary(kind):
+        yield array.dictionary
+    elif pa.types.is_struct(kind):
+        for i in range(kind.num_fields):
+            yield from _dictionaries(array.field(i))
+    elif pa.types.is_list(kind) or pa.types.is_large_list(kind) or pa.types.is_fixed_size_list(kind) or pa.types.is_map(kind):
+        yield from _dictionaries(array.values)
+
+
+def to_pandas(value):
+    """``value`` as pandas, Arrow tables are converted and anything else is returned as is."""
+    if hasattr(value, "schema") and hasattr(value, "to_pandas"):
+        return value.to_pandas()
+    return value
+
+
+class LRUCache:
+    """Thread safe LRU cache bounded by entry count, total bytes and age.
+
+    Shared by every page in the server process, so it keeps hit / miss /
+    eviction counters that can be shown in the app or logged.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, ttl=None, sizer=sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizer = sizer
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = self._sizer(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            # a single value larger than the whole budget is returned but never stored
+            if self.max_bytes is not None and size > self.max_bytes:
+                return value
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.set(key, compute())
+        return value
+
+    def discard(self, predicate):
+        """Drop every entry whose key matches ``predicate``."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._drop(key)
+            self.evictions += 1
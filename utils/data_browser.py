@@ -0,0 +1,69 @@
+import streamlit as st
+
+from utils.datasets import DATASETS
+from utils.ingest import quote
+from utils.query import engine, sql
+from utils.sections import section
+
+PAGE_SIZES = (25, 100, 500)
+
+_TEXT_TYPES = ("VARCHAR", "ENUM", "UUID")
+
+
+@section
+def data_browser(table, page_size=100, key=None):
+    """Paginated view of a dataset table, one page of rows at a time.
+
+    Sorting, searching and paging all run in DuckDB, so only the visible
+    rows are sent to the browser whatever the size of the table. It runs
+    as a fragment, paging or searching reruns only the browser. Columns
+    derived at ingest are left out, the browser shows the dataset as it
+    was loaded.
+    """
+    key = key or f"browser_{table}"
+    derived = {name for name, _ in DATASETS[table].derived} if table in DATASETS else set()
+    columns = [(name, kind) for name, kind in engine.columns(table) if name not in derived]
+    names = [name for name, _ in columns]
+    text_columns = [name for name, kind in columns if kind.startswith(_TEXT_TYPES)]
+
+    col_search, col_sort, col_order, col_size = st.columns([3, 2, 1, 1])
+    with col_search:
+        search = st.text_input("Search", key=f"{key}_search", placeholder="Search text columns").strip()
+    with col_sort:
+        sort = st.selectbox("Sort by", ["(none)", *names], key=f"{key}_sort")
+    with col_order:
+        descending = st.toggle("Descending", key=f"{key}_desc")
+    with col_size:
+        page_size = st.selectbox("Rows", PAGE_SIZES, index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 1, key=f"{key}_size")
+
+    where, params = "", []
+    if search and text_columns:
+        where = "WHERE " + " OR ".join(f"CAST({quote(c)} AS VARCHAR) ILIKE ?" for c in text_columns)
+        params = [f"%{search}%"] * len(text_columns)
+
+    if where:
+        total = int(sql(f"SELECT COUNT(*) AS n FROM {table} {where}", params=params)["n"].iloc[0])
+        estimated = False
+    else:
+        total = engine.estimated_rows(table) or 0
+        estimated = True
+
+    pages = max(1, -(-total // page_size))
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    page = min(int(page), pages)
+
+    # rowid keeps the order of equal sort values stable between pages
+    order = f"ORDER BY {quote(sort)} {'DESC' if descending else 'ASC'}, rowid" if sort in names else "ORDER BY rowid"
+    rows = sql(
+        f"SELECT {', '.join(quote(name) for name in names)} FROM {table} {where} {order} LIMIT ? OFFSET ?",
+        params=[*params, page_size, (page - 1) * page_size],
+        arrow=True,
+    )
+
+    st.dataframe(rows, hide_index=True)
+    first = (page - 1) * page_size + 1 if total else 0
+    st.caption(
+        f"Rows {first:,}–{first + len(rows) - 1 if len(rows) else 0:,} of "
+        f"{'~' if estimated else ''}{total:,} (page {page:,} of {pages:,})"
+    )
+    return rows
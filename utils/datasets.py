@@ -0,0 +1,135 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+# Folder holding the csv files, can be pointed somewhere else for bigger copies
+DATA_DIR = Path(os.environ.get("PORTFOLIO_DATA_DIR", "Assets"))
+
+# Typed copies written by `python -m utils.build_parquet`
+PARQUET_DIR = Path(os.environ.get("PORTFOLIO_PARQUET_DIR", DATA_DIR / "parquet"))
+
+# New batches of rows, one folder per dataset (e.g. incoming/covid/*.csv)
+DROP_DIR = Path(os.environ.get("PORTFOLIO_DROP_DIR", DATA_DIR / "incoming"))
+
+
+def normalise_name(name):
+    # Change the string format of column names to make queries easier
+    return name.lower().replace(' ', '_').replace('(', '').replace(')', '')
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Where a dataset lives and how it is cleaned.
+
+    The cleaning steps are declared rather than coded, utils.ingest
+    applies them while DuckDB scans the file.
+    Column names in ``drop``, ``required``, ``filters``, ``uuids`` and
+    ``integers`` are the names after renaming.
+    """
+    name: str
+    filename: str
+    parse_dates: tuple = ()
+    # strptime format of the dates in the csv, for formats a small file
+    # could be misread in (3/1/2020 is the first of March)
+    date_format: str = None
+    # lower case snake_case column names
+    rename: bool = True
+    # unused columns
+    drop: tuple = ()
+    # rows with a missing value in one of these columns are dropped
+    required: tuple = ()
+    # (column, value) pairs a row must be equal to
+    filters: tuple = ()
+    # drop every column that still has a missing value after filtering
+    drop_null_columns: bool = False
+    # UUID strings, kept as 16 byte values
+    uuids: tuple = ()
+    # whole numbers the csv writes as floats, e.g. 6.0
+    integers: tuple = ()
+    # (name, SQL expression) columns computed once per load, an
+    # expression can use the columns derived before it
+    derived: tuple = ()
+    # column whose highest value marks how far the table goes, e.g. the
+    # last order date
+    watermark: str = None
+    # columns telling a row apart, appended rows matching a row of the
+    # table are left out (see utils.ingest.append); empty for all columns
+    identity: tuple = ()
+
+    @property
+    def path(self):
+        return DATA_DIR / self.filename
+
+    @property
+    def parquet_path(self):
+        return PARQUET_DIR / f"{self.name}.parquet"
+
+    @property
+    def drop_dir(self):
+        return DROP_DIR / self.name
+
+
+DATASETS = {
+    "ecommerce": DatasetSpec(
+        "ecommerce", "ecommerce_data.csv", ('Order_Date', 'Delivery_Date'),
+        rename=False,
+        watermark='Order_Date',
+        identity=('Order_ID',),
+        required=('Order_ID', 'Customer_ID', 'Price', 'Product_ID', 'Product_Name', 'Order_Date', 'Delivery_Date'),
+        uuids=('Order_ID', 'Customer_ID', 'Product_ID'),
+        integers=('Quantity',),
+        derived=(
+            ('total_sales', "Quantity * Price"),
+            ('delivery_days', "DATE_PART('day', Delivery_Date - Order_Date)"),
+            ('delay_bucket', """CASE
+                WHEN delivery_days = 0 THEN 'On Time or Early'
+                WHEN delivery_days BETWEEN 1 AND 1 THEN '1 Day Late'
+                WHEN delivery_days BETWEEN 2 AND 3 THEN '2-3 Days Late'
+                WHEN delivery_days > 3 THEN '4+ Days Late'
+            END"""),
+        ),
+    ),
+    "financial": DatasetSpec("financial", "financial_data.csv", ('Date',), watermark='date'),
+    "social_media": DatasetSpec(
+        "social_media", "sample_social_media_data.csv", ('post_date',),
+        watermark='post_date',
+        identity=('id',),
+        derived=(
+            ('post_hour', "HOUR(post_date)"),
+            ('post_month', "DATE_TRUNC('month', post_date)"),
+            ('interactions', "likes + comments + shares"),
+        ),
+    ),
+    "covid": DatasetSpec(
+        "covid", "covid_19.csv", ('Date',),
+        date_format='%m/%d/%Y',
+        watermark='date',
+        identity=('date', 'location_iso_code'),
+        drop=('province', 'country', 'continent'),
+        filters=(('location_level', 'Province'),),
+        drop_null_columns=True,
+    ),
+}
+
+
+def file_version(path):
+    """Identity of a file on disk, changes whenever the file is rewritten."""
+    stat = os.stat(path)
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def source_path(spec):
+    """Parquet copy when it is at least as new as the csv, else the csv."""
+    try:
+        parquet_mtime = os.stat(spec.parquet_path).st_mtime_ns
+    except FileNotFoundError:
+        return spec.path
+    try:
+        csv_mtime = os.stat(spec.path).st_mtime_ns
+    except FileNotFoundError:
+        return spec.parquet_path
+    return spec.parquet_path if parquet_mtime >= csv_mtime else spec.path
+
+
+def dataset_version(name):
+    return file_version(source_path(DATASETS[name]))
@@ -0,0 +1,68 @@
+import os
+
+import streamlit as st
+
+from utils import tracing
+
+
+def debug_server():
+    """The server was started with ``PORTFOLIO_DEBUG=1``."""
+    return os.environ.get("PORTFOLIO_DEBUG", "") not in ("", "0")
+
+
+def debug_requested():
+    """The panel is opt in, with ``PORTFOLIO_DEBUG=1`` or ``?debug=1``."""
+    return debug_server() or st.query_params.get("debug") == "1"
+
+
+def debug_controls():
+    """Tracing switch in the sidebar, call before the page runs.
+
+    Returns the id of the run about to start when it is traced, else
+    ``None``. On a ``PORTFOLIO_DEBUG`` server the switch is process wide
+    and records the spans of every session; with only ``?debug=1`` it
+    traces the runs of this session and nothing else.
+    """
+    if not debug_requested():
+        return None
+    if debug_server():
+        with st.sidebar:
+            on = st.toggle("Trace loads, queries and charts", value=tracing.enabled(), key="debug_trace")
+        tracing.enable(on)
+        return tracing.start_run() if on else None
+    with st.sidebar:
+        on = st.toggle("Trace this session", key="debug_trace")
+    return tracing.start_run(record=True) if on else None
+
+
+def debug_report(run):
+    """Spans of the run started by ``debug_controls``, call after the page ran."""
+    if run is None:
+        return
+    import pandas as pd
+
+    from utils.figures import figure_cache_stats
+    from utils.query import result_cache_stats
+
+    records = tracing.spans(run)
+    with st.sidebar.expander("Trace of this run", expanded=True):
+        if not records:
+            st.caption("Nothing recorded yet.")
+        else:
+            frame = pd.DataFrame(records)
+            columns = [c for c in ("kind", "name", "duration_ms", "cached", "rows_in", "rows_out", "bytes") if c in frame]
+            summary = frame.groupby("kind")["duration_ms"].agg(["count", "sum"]).round(1)
+            st.dataframe(summary)
+            st.dataframe(frame[columns].sort_values("duration_ms", ascending=False), hide_index=True)
+        timings = st.session_state.get("section_timings")
+        if timings:
+            # last run of every section, fragments rerun on their own (utils.sections)
+            st.dataframe(pd.DataFrame.from_dict(timings, orient="index"))
+        st.download_button("Download run (JSON lines)", tracing.to_jsonl(records), file_name=f"trace_run_{run}.jsonl")
+        if debug_server():
+            # the buffer holds the spans of every session
+            st.download_button("Download all spans", tracing.to_jsonl(), file_name="trace.jsonl")
+            if st.button("Clear spans"):
+                tracing.clear()
+        st.caption(f"Query results: {result_cache_stats()}")
+        st.caption(f"Figures: {figure_cache_stats()}")
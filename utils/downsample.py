@@ -0,0 +1,160 @@
+"""Downsampling of long time series before they are drawn.
+
+A chart a thousand pixels wide cannot show more than a couple of points
+per pixel, so a series is reduced in two steps before it leaves the
+server:
+
+1. DuckDB keeps the first, last, minimum and maximum point of every pixel
+   bucket of the visible window (M4), at most four points per pixel
+   whatever the number of rows.
+2. Largest-Triangle-Three-Buckets (LTTB) in NumPy picks the target number
+   of points out of those, keeping the ones that shape the line.
+
+Both steps keep the extremes, so peaks survive the reduction. Asking again
+for a narrower window (a zoom) spreads the same point budget over fewer
+days, which brings back the detail.
+"""
+import os
+
+import numpy as np
+
+from utils.query import sql
+
+# Width in pixels the downsampled charts are sized for, and points kept per pixel
+CHART_WIDTH_PX = int(os.environ.get("PORTFOLIO_CHART_WIDTH_PX", "1000"))
+POINTS_PER_PIXEL = float(os.environ.get("PORTFOLIO_POINTS_PER_PIXEL", "1"))
+
+
+def target_points(width_px=None, points_per_pixel=None):
+    """Points kept per series for a chart ``width_px`` pixels wide."""
+    width_px = width_px or CHART_WIDTH_PX
+    points_per_pixel = points_per_pixel or POINTS_PER_PIXEL
+    return max(3, int(width_px * points_per_pixel))
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points of ``(x, y)`` kept by LTTB.
+
+    ``x`` must be sorted. The first and last points are always kept, every
+    bucket in between keeps the point making the largest triangle with the
+    point kept before it and the average of the next bucket. The buckets
+    holding the lowest and the highest point keep that point instead, one
+    more point is kept when both fall in the same bucket.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets over the points between the first and the last one
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / sizes
+    avg_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / sizes
+    # the last bucket looks ahead to the last point
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    low, high = int(np.argmin(y)), int(np.argmax(y))
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if lo <= high < hi:
+            a = high
+        elif lo <= low < hi:
+            a = low
+        else:
+            # twice the triangle area, for every point of the bucket at once
+            area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+            a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    if low not in kept:
+        kept = np.sort(np.append(kept, low))
+    return kept
+
+
+def minmax(y, buckets):
+    """Indices of the minimum and maximum of ``y`` in each of ``buckets`` equal buckets."""
+    n = len(y)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    # buckets left empty by the padding are all NaN and skipped
+    filled = ~np.isnan(padded).all(axis=1)
+    offsets = np.arange(buckets)[filled] * size
+    low = offsets + np.nanargmin(padded[filled], axis=1)
+    high = offsets + np.nanargmax(padded[filled], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], low, high]))
+
+
+def minmax_lttb(x, y, n_out, ratio=4):
+    """LTTB over a min-max preselection of about ``ratio * n_out`` points."""
+    if len(y) <= n_out * ratio:
+        return lttb(x, y, n_out)
+    pre = minmax(y, n_out * ratio // 2)
+    return pre[lttb(np.asarray(x)[pre], np.asarray(y)[pre], n_out)]
+
+
+def m4_query(table, x, y, series, where="", buckets=1000):
+    """SQL of the M4 reduction of ``y`` over ``x`` per ``series``.
+
+    ``x`` is the SQL of the time key (e.g. ``date_trunc('day', date)``) and
+    ``y`` an aggregate, the series is first aggregated per (series, x).
+    Rows are split into ``buckets`` equal time buckets over the filtered
+    window and each bucket keeps its first, last, lowest and highest point.
+    Returns (series, bucket, x, y, n) rows, ``n`` the points of the bucket.
+    """
+    return f"""
+    WITH points AS (
+        SELECT {series} AS series, {x} AS x, {y} AS y
+        FROM {table}
+        {'WHERE ' + where if where else ''}
+        GROUP BY ALL
+    ),
+    bounds AS (
+        SELECT epoch(MIN(x)) AS low, GREATEST(epoch(MAX(x)) - epoch(MIN(x)), 1) AS span FROM points
+    ),
+    buckets AS (
+        SELECT
+            series,
+            LEAST(FLOOR((epoch(x) - low) / span * {buckets}), {buckets - 1}) AS bucket,
+            [MIN(x), ARG_MIN(x, y), ARG_MAX(x, y), MAX(x)] AS xs,
+            [ARG_MIN(y, x), MIN(y), MAX(y), ARG_MAX(y, x)] AS ys,
+            COUNT(*) AS n
+        FROM points, bounds
+        GROUP BY ALL
+    )
+    SELECT DISTINCT series, bucket, UNNEST(xs) AS x, UNNEST(ys) AS y, n
+    FROM buckets
+    ORDER BY series, x
+    """
+
+
+def downsampled_series(table, x, y, series, where="", params=None, points=None):
+    """Points of every series reduced to about ``points`` each, with the raw count.
+
+    ``where`` and ``params`` restrict the rows, a zoomed window included.
+    The M4 pass runs in DuckDB (cached like any query), LTTB then trims
+    every series to ``points`` (``target_points()`` by default). Returns
+    ``(frame, raw_points)``, the frame holding ``series``, ``x`` and ``y``.
+    """
+    import pandas as pd
+
+    points = points or target_points()
+    frame = sql(m4_query(table, x, y, series, where, buckets=points), params=params, arrow=True).to_pandas()
+    raw_points = int(frame.drop_duplicates(["series", "bucket"])["n"].sum())
+
+    parts = []
+    for _, part in frame.groupby("series", sort=False, observed=True):
+        kept = minmax_lttb(part["x"].to_numpy(dtype="datetime64[ns]").astype(np.int64), part["y"].to_numpy(), points)
+        parts.append(part.iloc[kept])
+    if parts:
+        frame = pd.concat(parts, ignore_index=True)
+    return frame[["series", "x", "y"]], raw_points
@@ -0,0 +1,82 @@
+import io
+import os
+
+import streamlit as st
+
+from utils.cache import LRUCache, code_identity, fingerprint, to_pandas
+from utils.tracing import span
+
+# Memory budget for rendered chart images
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("PORTFOLIO_FIGURE_CACHE_MB", "64")) * 1024 * 1024
+
+_images = LRUCache(max_entries=256, max_bytes=FIGURE_CACHE_MAX_BYTES)
+
+# st.image shrinks wider images to this width on every call, PNGs are
+# rendered at most this wide instead
+MAX_IMAGE_WIDTH = 1460
+
+
+def render_figure(draw, *data, style=None, fmt="png", dpi=200, **params):
+    """Image bytes of ``draw(*data, **params)``, rendered once per input.
+
+    ``draw`` builds and returns a matplotlib Figure. The cache key covers
+    the draw function, a hash of the data, the style and every parameter,
+    so matplotlib is only touched on a miss. The figure is always closed.
+    Arrow tables in ``data`` are converted to pandas on a miss only.
+    ``dpi`` is lowered for PNGs that would be wider than MAX_IMAGE_WIDTH.
+    """
+    # editing a draw function must invalidate the images it made
+    key = (code_identity(draw), fingerprint(*data), style, fmt, dpi, fingerprint(sorted(params.items())))
+
+    def render():
+        import matplotlib
+        import matplotlib.pyplot as plt
+
+        # keep style changes of one chart from leaking into the others
+        with matplotlib.rc_context(), plt.style.context(style or "default"):
+            fig = draw(*map(to_pandas, data), **params)
+            try:
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=fmt, dpi=_fit_dpi(fig, dpi) if fmt == "png" else dpi, bbox_inches="tight")
+            finally:
+                plt.close(fig)
+        return buffer.getvalue()
+
+    with span("chart", draw.__qualname__, fmt=fmt) as trace:
+        if trace.recording:
+            trace.set(cached=key in _images, rows_in=sum(len(frame) for frame in data))
+        image = _images.get_or_compute(key, render)
+        trace.set(bytes=len(image))
+    return image
+
+
+def _fit_dpi(fig, dpi):
+    import matplotlib
+
+    # inches of the tight bounding box savefig crops to, padding included;
+    # text extents move a little with the dpi, so measure again at the
+    # dpi of the first guess
+    pad = 2 * matplotlib.rcParams["savefig.pad_inches"]
+    for _ in range(2):
+        width = fig.get_tightbbox().width + pad
+        if width * dpi <= MAX_IMAGE_WIDTH:
+            break
+        dpi = MAX_IMAGE_WIDTH / width
+        fig.set_dpi(dpi)
+    return dpi
+
+
+def show_figure(draw, *data, use_container_width=True, **params):
+    """Drop in replacement of ``st.pyplot`` serving the cached image."""
+    image = render_figure(draw, *data, **params)
+    if params.get("fmt") == "svg":
+        image = image.decode()
+    st.image(image, width="stretch" if use_container_width else "content")
+
+
+def figure_cache_stats():
+    return _images.stats()
+
+
+def clear_figure_cache():
+    _images.clear()
@@ -0,0 +1,127 @@
+"""Sidebar filters pushed down into the DuckDB queries of a page.
+
+A page asks for its filters once with ``sidebar_filters`` and adds the
+returned predicate to its queries as bound parameters, nothing is
+filtered in pandas afterwards. Results are cached by ``sql`` per query
+and parameter values, so every filter combination is computed once and
+kept in the bounded result cache.
+"""
+import calendar
+import datetime as dt
+from dataclasses import dataclass, replace
+
+import streamlit as st
+
+from utils.ingest import quote
+from utils.query import sql
+from utils.rollups import ROLLUPS
+
+
+@dataclass(frozen=True)
+class Filters:
+    date_column: str
+    # inclusive dates, None when the range starts before or ends after the data
+    start: dt.date = None
+    end: dt.date = None
+    # (column, selected values) pairs, an empty selection keeps every value
+    values: tuple = ()
+
+    @property
+    def active(self):
+        return self.start is not None or self.end is not None or any(selected for _, selected in self.values)
+
+    def predicate(self, date_column=None):
+        """``(condition, params)`` to AND into a WHERE clause, ``("", [])`` if nothing is filtered."""
+        column = quote(date_column or self.date_column)
+        conditions, params = [], []
+        if self.start is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(self.start)
+        if self.end is not None:
+            # the end date is inclusive, compare with the start of the next day
+            conditions.append(f"{column} < ?")
+            params.append(self.end + dt.timedelta(days=1))
+        for name, selected in self.values:
+            if selected:
+                conditions.append(f"{quote(name)} IN ({', '.join('?' * len(selected))})")
+                params.extend(selected)
+        return " AND ".join(conditions), params
+
+    def where(self, date_column=None):
+        """``(WHERE clause, params)`` of the filters."""
+        condition, params = self.predicate(date_column)
+        return (f"WHERE {condition}" if condition else ""), params
+
+    def within(self, start=None, end=None):
+        """The filters with their date range narrowed to ``start`` .. ``end`` (inclusive)."""
+        if start is not None and self.start is not None:
+            start = max(start, self.start)
+        if end is not None and self.end is not None:
+            end = min(end, self.end)
+        return replace(self, start=start or self.start, end=end or self.end)
+
+    def whole_months(self):
+        start_ok = self.start is None or self.start.day == 1
+        end_ok = self.end is None or self.end.day == calendar.monthrange(self.end.year, self.end.month)[1]
+        return start_ok and end_ok
+
+
+def rollup_source(name, filters):
+    """``(FROM source, params)`` for a monthly rollup under ``filters``.
+
+    The materialised rollup is read as long as the filters can be answered
+    from it (whole months, only its group keys filtered), otherwise the
+    rollup is recomputed from the dataset table with the filters applied.
+    """
+    rollup = ROLLUPS[name]
+    keys = {key for key, _ in rollup.keys}
+    filtered = {column for column, selected in filters.values if selected}
+    if not filters.active:
+        return rollup.name, []
+    if filters.whole_months() and filtered <= keys:
+        where, params = filters.where(date_column="month")
+        return f"(SELECT * FROM {rollup.name} {where})", params
+    where, params = filters.where()
+    return f"({rollup.select(where)})", params
+
+
+def sidebar_filters(table, date_column, columns=(), key=None):
+    """Date range and value filters of ``table`` in the sidebar.
+
+    ``columns`` are low cardinality columns offered as multiselects. The
+    date range defaults to the whole data.
+    """
+    key = key or f"filters_{table}"
+    bounds = sql(f"SELECT MIN({quote(date_column)}) AS low, MAX({quote(date_column)}) AS high FROM {table}")
+    low, high = bounds["low"].iloc[0].date(), bounds["high"].iloc[0].date()
+
+    with st.sidebar:
+        st.markdown("**Filters**")
+        picked = st.date_input(
+            "Date range",
+            value=(low, high),
+            min_value=low,
+            max_value=high,
+            key=f"{key}_dates",
+        )
+        values = []
+        for column in columns:
+            options = sql(f"SELECT DISTINCT {quote(column)} AS v FROM {table} WHERE {quote(column)} IS NOT NULL ORDER BY 1")["v"]
+            selected = st.multiselect(column.replace("_", " ").capitalize(), options.tolist(), key=f"{key}_{column}")
+            values.append((column, tuple(selected)))
+
+    # a half picked range (first click of the calendar) keeps its open end
+    start, end = (tuple(picked) + (None, None))[:2]
+    return Filters(
+        date_column,
+        start=start if start is not None and start > low else None,
+        end=end if end is not None and end < high else None,
+        values=tuple(values),
+    )
+
+
+def require_rows(frame):
+    """Stop the page with a note when the filters leave nothing to show."""
+    if len(frame) == 0:
+        st.info("No data matches the selected filters.")
+        st.stop()
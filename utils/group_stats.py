@@ -0,0 +1,99 @@
+"""One-way ANOVA from per-group sufficient statistics.
+
+Testing whether a measure differs across the levels of a column only needs
+three numbers per level: the count, the mean and the sum of squared
+deviations from that mean. DuckDB computes them for every measure and
+every grouping column in one scan (GROUPING SETS), so the rows are never
+pulled into Python lists as ``scipy.stats.f_oneway`` would need. The F
+statistic, p-value and effect sizes then come from a few hundred numbers
+in NumPy.
+
+The query goes through ``sql()``, so its result is cached per data
+version like any other query of a page.
+"""
+from utils.ingest import quote
+
+
+def stats_query(table, measures, dimensions, where=""):
+    """SQL of the sufficient statistics of ``measures`` per level of each of ``dimensions``.
+
+    Returns one row per (dimension, level) with ``<measure>_n``,
+    ``<measure>_mean`` and ``<measure>_ss`` (squared deviations from the
+    level mean) for every measure. Rows with a NULL measure are left out
+    of that measure only, rows with a NULL level of a dimension are left
+    out of its test.
+    """
+    columns = [quote(dimension) for dimension in dimensions]
+    grouping = f"GROUPING({', '.join(columns)})"
+    # GROUPING() sets the bit of every column left out of the set, the
+    # set of the dimension at position i has all bits but its own
+    width = len(columns)
+    which = " ".join(
+        f"WHEN {(1 << width) - 1 - (1 << (width - 1 - i))} THEN '{dimension}'"
+        for i, dimension in enumerate(dimensions)
+    )
+    level = f"COALESCE({', '.join(f'CAST({column} AS VARCHAR)' for column in columns)})"
+    aggregates = ", ".join(
+        f"COUNT({quote(m)}) AS {quote(m + '_n')}, AVG({quote(m)}) AS {quote(m + '_mean')}, "
+        f"VAR_POP({quote(m)}) * COUNT({quote(m)}) AS {quote(m + '_ss')}"
+        for m in measures
+    )
+    sets = ", ".join(f"({column})" for column in columns)
+    return f"""
+    SELECT CASE {grouping} {which} END AS dimension, {level} AS level, {aggregates}
+    FROM {table}
+    {where}
+    GROUP BY GROUPING SETS ({sets})
+    HAVING {level} IS NOT NULL
+    ORDER BY dimension, level
+    """
+
+
+def anova(stats, measures, dimensions):
+    """One-way ANOVA of every measure across every dimension from ``stats_query`` rows.
+
+    ``stats`` is the query result as an Arrow table or DataFrame. Returns
+    an Arrow table with one row per (measure, dimension): the number of
+    groups, F with its degrees of freedom, the p-value and two effect
+    sizes, eta squared (share of the variance explained by the groups)
+    and omega squared (the same, corrected for the bias of small groups).
+    Tests with fewer than two non-empty groups, or no spread within them,
+    have NULL statistics.
+    """
+    import numpy as np
+    import pyarrow as pa
+    from scipy.special import fdtrc
+
+    if not isinstance(stats, pa.Table):
+        stats = pa.Table.from_pandas(stats, preserve_index=False)
+    dimension = stats["dimension"].to_numpy(zero_copy_only=False)
+
+    rows = {key: [] for key in ("measure", "dimension", "groups", "df_between", "df_within", "F", "p_value", "eta_squared", "omega_squared")}
+    for measure in measures:
+        n_all = stats[f"{measure}_n"].to_numpy(zero_copy_only=False).astype(np.float64)
+        mean_all = stats[f"{measure}_mean"].to_numpy(zero_copy_only=False).astype(np.float64)
+        ss_all = stats[f"{measure}_ss"].to_numpy(zero_copy_only=False).astype(np.float64)
+        for name in dimensions:
+            selected = (dimension == name) & (n_all > 0)
+            n, mean, ss = n_all[selected], mean_all[selected], ss_all[selected]
+            groups, total = len(n), n.sum()
+            grand_mean = (n * mean).sum() / total if total else np.nan
+            ss_between = (n * (mean - grand_mean) ** 2).sum()
+            ss_within = ss.sum()
+            df_between, df_within = max(groups - 1, 0), total - groups
+            if df_between > 0 and df_within > 0 and ss_within > 0:
+                ms_within = ss_within / df_within
+                f = float((ss_between / df_between) / ms_within)
+                p = float(fdtrc(df_between, df_within, f))
+                eta = float(ss_between / (ss_between + ss_within))
+                omega = max(float((ss_between - df_between * ms_within) / (ss_between + ss_within + ms_within)), 0.0)
+            else:
+                f = p = eta = omega = None
+            for key, value in zip(rows, (measure, name, groups, df_between, int(df_within), f, p, eta, omega)):
+                rows[key].append(value)
+
+    return pa.table({
+        **{key: rows[key] for key in ("measure", "dimension")},
+        **{key: pa.array(rows[key], type=pa.int64()) for key in ("groups", "df_between", "df_within")},
+        **{key: pa.array(rows[key], type=pa.float64()) for key in ("F", "p_value", "eta_squared", "omega_squared")},
+    })
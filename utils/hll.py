@@ -0,0 +1,94 @@
+"""Approximate distinct counts from HyperLogLog sketches kept in DuckDB.
+
+A sketch of a set of values is ``REGISTERS`` small numbers: every value
+is hashed, the low ``PRECISION`` bits pick a register and the register
+keeps the highest rank (trailing zeros + 1) of the other bits seen. The
+sketches live in rollup tables (see utils.rollups) as one row per group
+and touched register, so
+
+* the sketch of a bigger group (all platforms, a range of months) is the
+  union of the stored ones, the ``MAX(rho)`` per register, no rescan of
+  the posts;
+* appended rows only rebuild the registers of the months they touch.
+
+The relative standard error of an estimate is ``1.04 / sqrt(REGISTERS)``,
+about 1.6% with the default precision of 12.
+"""
+import math
+import os
+
+# Bits of the hash picking the register, 4 to 16
+PRECISION = min(max(int(os.environ.get("PORTFOLIO_HLL_PRECISION", "12")), 4), 16)
+REGISTERS = 1 << PRECISION
+
+
+def register_sql(column):
+    """SQL of the register a value of ``column`` falls in."""
+    return f"(hash({column}) & {REGISTERS - 1})"
+
+
+def rho_sql(column):
+    """SQL of the rank of a value of ``column``: trailing zeros of the rest of its hash, plus one."""
+    rest = f"(hash({column}) >> {PRECISION})"
+    # (x - 1) & ~x keeps exactly the trailing zeros of x set
+    return f"(CASE WHEN {rest} = 0 THEN {64 - PRECISION + 1} ELSE bit_count(({rest} - 1) & ~{rest}) + 1 END)"
+
+
+def sketch_keys(column):
+    """Rollup keys of a sketch of ``column``, added to the keys of the group."""
+    return (("register", register_sql(column)),)
+
+
+def sketch_measures(column):
+    """Rollup measures of a sketch of ``column``, the rank kept by every register."""
+    return (("rho", f"MAX({rho_sql(column)})"),)
+
+
+def relative_error():
+    """Relative standard error of the estimates."""
+    return 1.04 / math.sqrt(REGISTERS)
+
+
+def _sigma_sql(x):
+    """SQL of Ertl's sigma(x) = x + sum x^(2^k) 2^(k-1), unrolled far enough for ``REGISTERS``."""
+    terms = [x] + [f"POW({x}, {2 ** k}) * {2 ** (k - 1)}" for k in range(1, PRECISION + 12)]
+    return " + ".join(terms)
+
+
+def estimate_sql(registers):
+    """Estimate aggregate over ``registers`` rows (one ``rho`` per register of a group).
+
+    Ertl's improved estimator ("New cardinality estimation algorithms for
+    HyperLogLog sketches", 2017): the registers a group never touched enter
+    through sigma(empty / m), which removes the bias of the raw estimate
+    for small and mid sized sets without the bias tables of HLL++. The
+    correction for registers at the highest rank is left out, a register
+    only gets there once in 2^(64 - PRECISION) values.
+    """
+    empty = f"(({REGISTERS} - COUNT(*)) / {REGISTERS}.0)"
+    z = f"({REGISTERS} * ({_sigma_sql(empty)}) + SUM(POW(2.0, -{registers}.rho)))"
+    return f"{REGISTERS * REGISTERS / (2 * math.log(2))} / {z}"
+
+
+def distinct_query(source, groupings):
+    """SQL estimating the distinct values per grouping of a sketch table.
+
+    ``source`` holds the sketch rows (group keys, ``register``, ``rho``),
+    ``groupings`` is a list of key tuples, e.g. ``[("month",), ("month",
+    "platform")]``. The sketches are merged per grouping (one GROUPING
+    SETS pass) and the estimate rounded to whole values. Keys missing
+    from a grouping are NULL in its rows.
+    """
+    keys = sorted({key for grouping in groupings for key in grouping})
+    sets = ", ".join(f"({', '.join((*grouping, 'register'))})" for grouping in groupings)
+    key_list = ", ".join(keys)
+    return f"""
+    WITH merged AS (
+        SELECT {key_list}, GROUPING({key_list}) AS _grouping, register, MAX(rho) AS rho
+        FROM {source}
+        GROUP BY GROUPING SETS ({sets})
+    )
+    SELECT {key_list}, _grouping, CAST(ROUND({estimate_sql('merged')}) AS BIGINT) AS estimate
+    FROM merged
+    GROUP BY {key_list}, _grouping
+    """
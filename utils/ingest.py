@@ -0,0 +1,164 @@
+"""Load datasets straight into DuckDB without building a pandas frame.
+
+The csv (or parquet copy) is scanned by DuckDB's streaming reader, the
+renaming, projection and row filters of the dataset spec are applied
+during the scan, so peak memory does not grow with the file size.
+"""
+import os
+from pathlib import Path
+
+from utils.datasets import DATASETS, normalise_name, source_path
+
+# Strings pandas reads as missing values, kept identical so both loaders agree
+NULL_STRINGS = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# DuckDB memory limit, it spills to a temp directory instead of growing past it
+MEMORY_LIMIT = os.environ.get("PORTFOLIO_DUCKDB_MEMORY_LIMIT")
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def configure(con):
+    if MEMORY_LIMIT:
+        con.execute(f"SET memory_limit = {_literal(MEMORY_LIMIT)}")
+
+
+def source_query(con, spec, path=None, scan=None):
+    """SELECT returning the cleaned rows of ``spec``, evaluated lazily.
+
+    ``scan`` replaces the file with any relation holding the columns of
+    the csv as they are, e.g. ``read_parquet`` of generated parts.
+    """
+    if scan is None:
+        path = Path(path) if path else source_path(spec)
+        if path.suffix == ".parquet":
+            # the parquet copy is already cleaned, typed and enriched
+            query = f"SELECT * FROM read_parquet({_literal(path)})"
+            present = {row[0] for row in con.execute(f"DESCRIBE {query}").fetchall()}
+            return with_derived(query, [(n, e) for n, e in spec.derived if n not in present])
+
+        nulls = ", ".join(_literal(value) for value in NULL_STRINGS)
+        options = f", dateformat = {_literal(spec.date_format)}" if spec.date_format else ""
+        scan = f"read_csv({_literal(path)}, header = true, nullstr = [{nulls}]{options})"
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {scan}").fetchall()]
+
+    select = []
+    for column in columns:
+        name = normalise_name(column) if spec.rename else column
+        if name in spec.drop:
+            continue
+        expression = quote(column)
+        if column in spec.parse_dates:
+            # pandas parse_dates gives timestamps, keep the same type
+            expression = f"CAST({expression} AS TIMESTAMP)"
+        elif name in spec.uuids:
+            # 16 bytes instead of a 36 character string
+            expression = f"CAST({expression} AS UUID)"
+        elif name in spec.integers:
+            expression = f"CAST({expression} AS INTEGER)"
+        select.append(f"{expression} AS {quote(name)}")
+
+    where = [f"{quote(column)} = {_literal(value)}" for column, value in spec.filters]
+    where += [f"{quote(column)} IS NOT NULL" for column in spec.required]
+    query = f"SELECT * FROM (SELECT {', '.join(select)} FROM {scan})"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return with_derived(query, spec.derived)
+
+
+def with_derived(query, derived):
+    """``query`` plus the derived columns, materialised with the table so
+    pages read them instead of recomputing the expressions."""
+    if not derived:
+        return query
+    # DuckDB lets an expression refer to an alias defined before it
+    return f"SELECT *, {', '.join(f'{expr} AS {quote(name)}' for name, expr in derived)} FROM ({query})"
+
+
+def ingest(con, name, table=None, path=None, on_loaded=None, scan=None):
+    """(Re)create ``table`` from the source file of dataset ``name``.
+
+    ``on_loaded(con)`` runs inside the same transaction once the table is
+    filled, readers never see a new table next to stale derived tables.
+    ``scan`` is passed to ``source_query``.
+    """
+    spec = DATASETS[name]
+    table = table or name
+    query = source_query(con, spec, path, scan)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"CREATE OR REPLACE TABLE {quote(table)} AS {query}")
+        if spec.drop_null_columns and (scan is not None or Path(path or source_path(spec)).suffix != ".parquet"):
+            drop_null_columns(con, table)
+        if on_loaded is not None:
+            on_loaded(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return table
+
+
+def append(con, name, path, on_appended=None):
+    """Insert the cleaned rows of ``path`` into the table of ``name``.
+
+    The new rows are staged in the temp table ``_delta`` and
+    ``on_appended(con, "_delta")`` runs before the commit so derived
+    tables can be brought up to date with the same transaction. Rows
+    already in the table (same ``identity`` columns, see DatasetSpec) are
+    left out, so a batch delivered twice or overlapping the previous one
+    is only added once. Returns the number of rows appended and the
+    number left out.
+    """
+    spec = DATASETS[name]
+    query = source_query(con, spec, path)
+    columns = [quote(row[0]) for row in con.execute(f"DESCRIBE {quote(name)}").fetchall()]
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE _delta AS SELECT {', '.join(columns)} FROM ({query})")
+        skipped = con.execute(_delete_known_rows(spec, name, columns)).fetchone()[0]
+        con.execute(f"INSERT INTO {quote(name)} BY NAME SELECT * FROM _delta")
+        rows = con.execute("SELECT COUNT(*) FROM _delta").fetchone()[0]
+        if on_appended is not None:
+            on_appended(con, "_delta")
+        con.execute("DROP TABLE _delta")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return rows, skipped
+
+
+def _delete_known_rows(spec, table, columns):
+    """SQL deleting the rows of ``_delta`` the table already holds."""
+    identity = [quote(column) for column in spec.identity] or columns
+    match = " AND ".join(f"t.{column} IS NOT DISTINCT FROM d.{column}" for column in identity)
+    if spec.watermark:
+        # a row sent again carries its date again, only the table rows from
+        # the first date of the batch on can match
+        watermark = quote(spec.watermark)
+        match += f" AND t.{watermark} >= (SELECT MIN({watermark}) FROM _delta)"
+    return f"""
+    DELETE FROM _delta WHERE rowid IN (
+        SELECT d.rowid FROM _delta AS d WHERE EXISTS (SELECT 1 FROM {quote(table)} AS t WHERE {match})
+    )
+    """
+
+
+def drop_null_columns(con, table):
+    columns = [row[0] for row in con.execute(f"DESCRIBE {quote(table)}").fetchall()]
+    counts = con.execute(
+        "SELECT " + ", ".join(f"COUNT(*) - COUNT({quote(c)})" for c in columns) + f" FROM {quote(table)}"
+    ).fetchone()
+    for column, missing in zip(columns, counts):
+        if missing:
+            con.execute(f"ALTER TABLE {quote(table)} DROP COLUMN {quote(column)}")
@@ -0,0 +1,150 @@
+import os
+from pathlib import Path
+
+from utils.cache import LRUCache, code_identity, fingerprint, to_pandas
+from utils.tracing import span
+
+# Rendered maps are kept on disk so a restarted server does not rebuild them
+MAP_CACHE_DIR = Path(os.environ.get("PORTFOLIO_CACHE_DIR", ".cache")) / "maps"
+# Most recently used maps kept in MAP_CACHE_DIR, older files are deleted
+MAP_CACHE_FILES = int(os.environ.get("PORTFOLIO_MAP_CACHE_FILES", "32"))
+
+# Above this many locations a single GeoJSON layer keeps the page small
+GEOJSON_THRESHOLD = 100
+
+_maps = LRUCache(max_entries=32, max_bytes=64 * 1024 * 1024)
+
+
+# Draws the circles in the browser from column arrays, like folium's
+# FastMarkerCluster without the clustering
+_CIRCLES_SCRIPT = """
+{% macro script(this, kwargs) %}
+    (function(){
+        var data = {{ this.data|tojson }};
+        var layer = L.featureGroup();
+        for (var i = 0; i < data.lat.length; i++) {
+            L.circle([data.lat[i], data.lon[i]], {radius: data.radius[i], color: 'crimson', fill: true, fillColor: 'crimson'})
+                .bindTooltip(data.label[i])
+                .addTo(layer);
+        }
+        layer.addTo({{ this._parent.get_name() }});
+    })();
+{% endmacro %}
+"""
+
+
+def _add_circles(m, geo_data, radius, tooltips):
+    from branca.element import MacroElement
+    from folium.template import Template
+
+    # one layer holding the columns, no folium Circle per location
+    layer = MacroElement()
+    layer._template = Template(_CIRCLES_SCRIPT)
+    layer.data = {
+        "lat": geo_data['latitude'].to_numpy(dtype=float).tolist(),
+        "lon": geo_data['longitude'].to_numpy(dtype=float).tolist(),
+        "radius": radius.astype(float).tolist(),
+        "label": tooltips,
+    }
+    m.add_child(layer)
+
+
+def _add_geojson(m, geo_data, radius, tooltips):
+    import folium
+
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+            "properties": {"label": tip, "radius": float(r)},
+        }
+        for lat, lon, r, tip in zip(geo_data['latitude'].to_numpy(), geo_data['longitude'].to_numpy(), radius, tooltips)
+    ]
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        marker=folium.Circle(color='crimson', fill=True, fill_color='crimson'),
+        style_function=lambda feature: {"radius": feature["properties"]["radius"]},
+        tooltip=folium.GeoJsonTooltip(fields=["label"], labels=False),
+    ).add_to(m)
+
+
+def build_cases_map(geo_data, layer="circles"):
+    import folium
+
+    geo_data = to_pandas(geo_data)
+    m = folium.Map(location=[geo_data['latitude'].mean(), geo_data['longitude'].mean()], zoom_start=5)
+
+    radius = (geo_data['total_cases'] / 5).to_numpy()
+    tooltips = (geo_data['location'].astype(str) + ": " + geo_data['total_cases'].astype(str) + " cases").tolist()
+
+    if layer == "geojson":
+        _add_geojson(m, geo_data, radius, tooltips)
+    else:
+        _add_circles(m, geo_data, radius, tooltips)
+    return m._repr_html_()
+
+
+def _builder_identity():
+    from importlib.metadata import version
+
+    return code_identity(build_cases_map, _add_circles, _add_geojson), _CIRCLES_SCRIPT, version("folium")
+
+
+def cases_map_html(geo_data, layer="auto"):
+    """HTML of the cases map, built once per data version.
+
+    ``layer`` is ``"circles"`` (circles drawn in the browser from the
+    location columns), ``"geojson"`` (a GeoJSON layer, one feature per
+    location) or ``"auto"`` which switches to GeoJSON above
+    ``GEOJSON_THRESHOLD`` locations. The key of the cached HTML covers the
+    map code and the folium version, a change to either rebuilds it.
+    """
+    if layer == "auto":
+        layer = "geojson" if len(geo_data) > GEOJSON_THRESHOLD else "circles"
+    key = fingerprint(geo_data, layer, _builder_identity())
+
+    def load_or_build():
+        path = MAP_CACHE_DIR / f"cases_{key}.html"
+        try:
+            # the modification time orders the files by last use
+            os.utime(path)
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            pass
+        html = build_cases_map(geo_data, layer)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(html, encoding="utf-8")
+        tmp_path.replace(path)
+        _prune_map_files()
+        return html
+
+    with span("chart", "cases_map", layer=layer, rows_in=len(geo_data)) as trace:
+        if trace.recording:
+            trace.set(cached=key in _maps)
+        html = _maps.get_or_compute(key, load_or_build)
+        trace.set(bytes=len(html))
+    return html
+
+
+def _prune_map_files():
+    """Delete all but the ``MAP_CACHE_FILES`` most recently used map files."""
+    files = []
+    for path in MAP_CACHE_DIR.glob("cases_*.html"):
+        try:
+            files.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            # removed by another session meanwhile
+            continue
+    files.sort(reverse=True)
+    for _, path in files[MAP_CACHE_FILES:]:
+        path.unlink(missing_ok=True)
+
+
+def map_cache_stats():
+    return _maps.stats()
+
+
+def clear_map_cache():
+    """Empty the in-memory cache, the files under MAP_CACHE_DIR are kept."""
+    _maps.clear()
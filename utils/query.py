@@ -0,0 +1,444 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+
+from utils.cache import LRUCache, fingerprint, sizeof
+from utils.datasets import DATASETS, dataset_version, file_version
+from utils.ingest import append, configure, ingest, quote
+from utils.rollups import ROLLUPS, materialise, merge_delta
+from utils import tracing
+from utils.tracing import span
+
+# DuckDB database file, tables and rollups survive restarts when it is set
+DATABASE = os.environ.get("PORTFOLIO_DUCKDB_PATH", ":memory:")
+
+# Bounds of the query result cache
+RESULT_CACHE_ENTRIES = int(os.environ.get("PORTFOLIO_RESULT_CACHE_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("PORTFOLIO_RESULT_CACHE_MB", "128")) * 1024 * 1024
+RESULT_CACHE_TTL = float(os.environ.get("PORTFOLIO_RESULT_CACHE_TTL", "3600"))
+
+# Seconds between two looks at the drop folder of a dataset (DatasetSpec.drop_dir)
+DROP_POLL_SECONDS = float(os.environ.get("PORTFOLIO_DROP_POLL_SECONDS", "5"))
+
+# Threads running the queries a page submits together, shared by every session
+QUERY_THREADS = int(os.environ.get("PORTFOLIO_QUERY_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+def normalise_query(query):
+    """Query text with whitespace collapsed outside of string literals."""
+    parts = query.strip().rstrip(";").split("'")
+    # even parts are outside quotes
+    parts[::2] = [re.sub(r"\s+", " ", part) for part in parts[::2]]
+    return "'".join(parts).strip()
+
+
+class QueryEngine:
+    """One DuckDB database per server process shared by every page.
+
+    Each dataset is streamed once from its file into a native DuckDB table
+    named after the dataset (``ecommerce``, ``financial``, ``social_media``,
+    ``covid``) and reloaded only when its source file changes, together
+    with its monthly rollups (see utils.rollups). Queries run on a cursor
+    owned by the calling thread, so concurrent sessions never share a
+    connection object.
+
+    The version of a dataset is its file version plus the number of
+    batches appended since it was loaded. Batches are csv files dropped in
+    the dataset's folder under ``DROP_DIR``: they are picked up by the
+    next query once ``DROP_POLL_SECONDS`` have passed, in name order, and
+    only their rows the table does not hold yet are added. Only the rollup
+    groups they touch are updated.
+
+    Tables are kept compact: UUID columns are stored as DuckDB UUIDs (16
+    bytes), whole numbers as integers, and every load is checkpointed so
+    repeated text is dictionary encoded. UUIDs are handed back as text,
+    queries see the same values as before.
+    """
+
+    def __init__(self, database=DATABASE, compress=True):
+        self._con = duckdb.connect(database)
+        configure(self._con)
+        self._compress = compress
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # dataset -> callables kept up to date by every append, see on_append
+        self._append_listeners = {}
+        # dataset -> time of the last look at its drop folder
+        self._polled = {}
+        self._polling = threading.Lock()
+        self._con.execute("CREATE TABLE IF NOT EXISTS _dataset_versions (dataset VARCHAR PRIMARY KEY, version VARCHAR)")
+        self._con.execute("CREATE TABLE IF NOT EXISTS _watermarks (dataset VARCHAR PRIMARY KEY, watermark TIMESTAMP)")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS _appended_files "
+            "(dataset VARCHAR, path VARCHAR, mtime_ns BIGINT, size BIGINT, rows BIGINT, skipped BIGINT)"
+        )
+        tables = {row[0] for row in self._con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        columns = set(self._con.execute("SELECT table_name, column_name FROM duckdb_columns()").fetchall())
+        # a stored dataset is reused only when it, its derived columns and
+        # all its rollups exist
+        self._versions = {
+            name: _decode_version(version)
+            for name, version in self._con.execute("SELECT dataset, version FROM _dataset_versions").fetchall()
+            if name in tables
+            and all(r.name in tables for r in ROLLUPS.values() if r.dataset == name)
+            and all((name, column) in columns for column, _ in DATASETS[name].derived)
+        }
+        self.results = LRUCache(
+            max_entries=RESULT_CACHE_ENTRIES,
+            max_bytes=RESULT_CACHE_MAX_BYTES,
+            ttl=RESULT_CACHE_TTL,
+        )
+
+    def cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self._local.cursor = self._con.cursor()
+        return cur
+
+    def referenced_datasets(self, query):
+        names = {name for name in DATASETS if re.search(rf"\b{name}\b", query, re.IGNORECASE)}
+        names.update(rollup.dataset for rollup in ROLLUPS.values() if re.search(rf"\b{rollup.name}\b", query, re.IGNORECASE))
+        return sorted(names)
+
+    def ensure_table(self, name):
+        """Create or refresh the table of a dataset, returns its version."""
+        file_version = dataset_version(name)
+        current = self._versions.get(name)
+        if current is None or current[0] != file_version:
+            with self._lock:
+                current = self._versions.get(name)
+                if current is None or current[0] != file_version:
+                    with span("load", name, source=file_version[0], bytes=file_version[2]) as trace:
+                        ingest(self._con, name, on_loaded=lambda con: self._loaded(con, name))
+                        self._checkpoint()
+                        if trace.recording:
+                            trace.set(rows_out=self._con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0])
+                    current = self._set_version(name, (file_version, 0))
+                    self._polled.pop(name, None)
+        if time.monotonic() - self._polled.get(name, float("-inf")) >= DROP_POLL_SECONDS:
+            current = self.append_dropped(name)
+        return current
+
+    def _loaded(self, con, name):
+        materialise(con, name)
+        # a reloaded table starts over, the dropped files are appended again
+        # and only add what the new source file does not hold yet
+        con.execute("DELETE FROM _appended_files WHERE dataset = ?", [name])
+        column = DATASETS[name].watermark
+        if column:
+            con.execute(f"INSERT OR REPLACE INTO _watermarks SELECT ?, MAX({quote(column)}) FROM {name}", [name])
+
+    def append_dropped(self, name):
+        """Append the files of the dataset's drop folder not appended yet, returns its version."""
+        # one thread looks at the folders, the others go on with what is loaded
+        if not self._polling.acquire(blocking=False):
+            return self._versions[name]
+        try:
+            self._polled[name] = time.monotonic()
+            try:
+                paths = sorted(
+                    entry.path for entry in os.scandir(DATASETS[name].drop_dir)
+                    if entry.is_file() and entry.name.endswith(".csv")
+                )
+            except FileNotFoundError:
+                paths = []
+            if paths:
+                done = set(self.cursor().execute(
+                    "SELECT path, mtime_ns, size FROM _appended_files WHERE dataset = ?", [name]
+                ).fetchall())
+                for path in paths:
+                    if file_version(path) not in done:
+                        self.append(name, path)
+        finally:
+            self._polling.release()
+        return self._versions[name]
+
+    def append(self, name, path):
+        """Append the rows of another file to a dataset and its rollups.
+
+        Rows the table already holds are skipped and only the rollup groups
+        of the new rows are updated. Returns the number of rows appended.
+        """
+        self.ensure_table(name)
+        path, mtime_ns, size = file_version(path)
+        with self._lock, span("load", name, source=path) as trace:
+            rows, skipped = append(self._con, name, path, on_appended=lambda con, delta: self._appended(con, name, delta))
+            self._con.execute(
+                "INSERT INTO _appended_files VALUES (?, ?, ?, ?, ?, ?)", [name, path, mtime_ns, size, rows, skipped]
+            )
+            self._checkpoint()
+            trace.set(rows_out=rows, skipped=skipped)
+            loaded, appended = self._versions[name]
+            self._set_version(name, (loaded, appended + 1))
+        return rows
+
+    def watermark(self, name):
+        """Latest value of the dataset's watermark column loaded so far, e.g. its last order date."""
+        self.ensure_table(name)
+        return self._watermark(self.cursor(), name)
+
+    def _watermark(self, con, name):
+        row = con.execute("SELECT watermark FROM _watermarks WHERE dataset = ?", [name]).fetchone()
+        column = DATASETS[name].watermark
+        if row is None and column:
+            # a table stored before watermarks were kept
+            row = con.execute(f"SELECT MAX({quote(column)}) FROM {name}").fetchone()
+        return row[0] if row else None
+
+    def on_append(self, name, listener):
+        """Call ``listener(con, delta)`` for every batch appended to dataset ``name``.
+
+        It runs in the append's transaction once the rollups are refreshed,
+        ``delta`` being the table of the new rows, so in-memory structures
+        derived from a dataset can follow it without a reload.
+        """
+        self._append_listeners.setdefault(name, []).append(listener)
+
+    def _appended(self, con, name, delta):
+        merge_delta(con, name, delta)
+        column = DATASETS[name].watermark
+        if column:
+            con.execute(
+                f"""
+                INSERT OR REPLACE INTO _watermarks
+                SELECT ?, GREATEST(MAX({quote(column)}), (SELECT watermark FROM _watermarks WHERE dataset = ?)) FROM {delta}
+                """,
+                [name, name],
+            )
+        for listener in self._append_listeners.get(name, ()):
+            listener(con, delta)
+
+    def _checkpoint(self):
+        # rows are compressed (dictionary, bit packing) when they are
+        # checkpointed, freshly inserted rows are held uncompressed
+        if self._compress:
+            try:
+                self._con.execute("CHECKPOINT")
+            except duckdb.TransactionException:
+                # another write is running, DuckDB checkpoints again later
+                pass
+
+    def memory_usage(self):
+        """Bytes DuckDB holds for tables, indexes and buffers, by kind."""
+        rows = self._con.execute("SELECT tag, memory_usage_bytes FROM duckdb_memory() WHERE memory_usage_bytes > 0").fetchall()
+        return dict(rows)
+
+    def reset(self):
+        """Forget loaded versions and cached results, the next query reloads."""
+        with self._lock:
+            self._versions.clear()
+            self._con.execute("DELETE FROM _dataset_versions")
+            self.results.clear()
+
+    def _set_version(self, name, version):
+        self._con.execute("INSERT OR REPLACE INTO _dataset_versions VALUES (?, ?)", [name, json.dumps(version)])
+        self._versions[name] = version
+        # results of older versions can never be hit again
+        self.results.discard(lambda key: any(n == name and v != version for n, v in key[1]))
+        return version
+
+    def versions(self, query):
+        return tuple((name, self.ensure_table(name)) for name in self.referenced_datasets(query))
+
+    def sql(self, query, params=None, cache=True, arrow=False, **frames):
+        """Run a query and return a pandas DataFrame.
+
+        ``params`` are bound to the ``?`` / ``$n`` placeholders of the query.
+        Keyword arguments are DataFrames (or Arrow tables) made earlier on
+        the page, they are exposed under their keyword name for this call
+        only. Results are memoised on the normalised query text, the
+        parameters and the version of every dataset and frame it reads, so
+        a changed file is never served stale.
+
+        With ``arrow=True`` the result is a ``pyarrow.Table`` straight from
+        DuckDB. It is never converted to pandas: ``st.dataframe`` and later
+        queries read it as it is, and being immutable it is handed out of
+        the cache without a copy.
+        """
+        with span("query", query) as trace:
+            versions = self.versions(query)
+            if not cache:
+                result = self._execute(query, params, frames, arrow)
+            else:
+                key = (
+                    normalise_query(query),
+                    versions,
+                    tuple(sorted((name, fingerprint(frame)) for name, frame in frames.items())),
+                    fingerprint(params) if params else None,
+                    arrow,
+                )
+                if trace.recording:
+                    trace.set(cached=key in self.results)
+                result = self.results.get_or_compute(key, lambda: self._execute(query, params, frames, arrow))
+                if not arrow:
+                    # callers are free to modify what they get back
+                    result = result.copy()
+            if trace.recording:
+                trace.set(
+                    name=normalise_query(query),
+                    rows_in=sum(len(frame) for frame in frames.values()),
+                    rows_out=len(result),
+                    bytes=sizeof(result),
+                    arrow=arrow,
+                )
+            return result
+
+    def columns(self, table):
+        """(name, type) of every column of a dataset table."""
+        self.ensure_table(table)
+        return [(row[0], row[1]) for row in self.cursor().execute(f"DESCRIBE {table}").fetchall()]
+
+    def estimated_rows(self, table):
+        self.ensure_table(table)
+        row = self.cursor().execute(
+            "SELECT estimated_size FROM duckdb_tables() WHERE table_name = ?", [table]
+        ).fetchone()
+        return row[0] if row else None
+
+    def _execute(self, query, params, frames, arrow=False):
+        cur = self.cursor()
+        for name, frame in frames.items():
+            cur.register(name, frame)
+        try:
+            result = cur.execute(query, params)
+            if arrow:
+                # DuckDB hands UUIDs to Arrow as text already
+                table = result.to_arrow_table()
+                for i, (column, kind, *_) in enumerate(result.description):
+                    if str(kind) == "HUGEINT":
+                        table = table.set_column(i, column, _hugeint_to_int(table.column(i)))
+                return table
+            frame = result.df()
+            # UUID columns come back as text, the same values the csv holds
+            for column, kind, *_ in result.description:
+                if str(kind) == "UUID":
+                    frame[column] = frame[column].astype("str")
+            return frame
+        finally:
+            for name in frames:
+                cur.unregister(name)
+
+
+def _hugeint_to_int(column):
+    # SUM and COUNT of integers are HUGEINT, exported as decimal128 which
+    # pandas would turn into Python Decimals
+    import pyarrow as pa
+
+    try:
+        return column.cast(pa.int64())
+    except pa.ArrowInvalid:
+        return column.cast(pa.float64())
+
+
+def _decode_version(text):
+    file_version, appended = json.loads(text)
+    return (tuple(file_version), appended)
+
+
+engine = QueryEngine()
+
+
+# SQL function
+def sql(sql_query, params=None, cache=True, arrow=False, **frames):
+    return engine.sql(sql_query, params=params, cache=cache, arrow=arrow, **frames)
+
+
+def result_cache_stats():
+    return engine.results.stats()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="query")
+    return _pool
+
+
+def submit(query, *args, **kwargs):
+    """Start ``sql(query, ...)`` on the query pool and return its Future.
+
+    ``query`` can also be a callable, e.g. a ``shared_scan`` bound with
+    functools.partial, it is then called with the other arguments. Each
+    pool thread has its own cursor of the shared connection and DuckDB
+    releases the GIL while a query runs, so submitted queries overlap.
+    """
+    call = query if callable(query) else sql
+    args = args if callable(query) else (query, *args)
+    run, record = tracing.current_run()
+
+    def task():
+        # spans recorded on the pool belong to the page run that submitted them
+        with tracing.in_run(run, record):
+            return call(*args, **kwargs)
+
+    return _executor().submit(task)
+
+
+def run_batch(*, arrow=False, **queries):
+    """Run independent queries together, returns their results by name.
+
+    Each value is a query string, a (query, params) pair or a callable.
+    The page waits for the slowest query instead of the sum of all of them;
+    results come back in the order they were given. ``arrow`` is passed to
+    ``sql`` for the query strings, callables choose for themselves.
+    """
+    futures = {}
+    for name, query in queries.items():
+        if isinstance(query, tuple):
+            query, params = query
+            futures[name] = submit(query, params=params, arrow=arrow)
+        elif callable(query):
+            futures[name] = submit(query)
+        else:
+            futures[name] = submit(query, arrow=arrow)
+    return {name: future.result() for name, future in futures.items()}
+
+
+def shared_scan(table, groupings, measures, where="", params=None, arrow=False):
+    """Aggregates of several GROUP BY keys over ``table`` in one scan.
+
+    ``groupings`` maps a result name to the key columns of one sibling
+    aggregation, ``measures`` is a sequence of (name, aggregate SQL) pairs
+    computed for every grouping. The groupings run as GROUPING SETS of a
+    single query, so the table is read once however many charts use it.
+    Returns a dict of DataFrames (Arrow tables with ``arrow=True``) keyed
+    like ``groupings``, each with its keys and every measure; pages take
+    their own projection of it.
+    """
+    keys = list(dict.fromkeys(key for columns in groupings.values() for key in columns))
+    sets = ", ".join("(" + ", ".join(columns) + ")" for columns in groupings.values())
+    select = [*keys, *(f"{expr} AS {name}" for name, expr in measures)]
+    if len(groupings) > 1:
+        select.append(f"GROUPING({', '.join(keys)}) AS _grouping")
+    result = sql(
+        f"SELECT {', '.join(select)} FROM {table} {'WHERE ' + where if where else ''} GROUP BY GROUPING SETS ({sets})",
+        params=params,
+        arrow=arrow,
+    )
+
+    frames = {}
+    for name, columns in groupings.items():
+        part = result
+        selected = [*columns, *(measure for measure, _ in measures)]
+        if len(groupings) > 1:
+            # GROUPING() sets the bit of every key left out of the set, first key highest
+            mask = sum(1 << (len(keys) - 1 - i) for i, key in enumerate(keys) if key not in columns)
+            if arrow:
+                import pyarrow.compute as pc
+
+                part = result.filter(pc.field("_grouping") == mask)
+            else:
+                part = result[result["_grouping"] == mask]
+        frames[name] = part.select(selected) if arrow else part[selected].reset_index(drop=True)
+    return frames
@@ -0,0 +1,144 @@
+"""Month level rollup tables built from the dataset tables at ingest.
+
+Every rollup is grouped by ``month`` (plus optional extra keys) and only
+holds aggregates that can be recomputed one month at a time, so rows
+appended to a dataset only refresh the months they touch. Sums, counts,
+minimums and maximums are not even recomputed: the rollup of the new
+rows is folded into the groups it shares with the table.
+"""
+from dataclasses import dataclass
+
+from utils import hll
+from utils.ingest import quote
+
+
+@dataclass(frozen=True)
+class Rollup:
+    name: str
+    dataset: str
+    # SQL expression of the month of a row of the dataset table
+    month: str
+    # extra group keys, output name -> SQL expression
+    keys: tuple = ()
+    # output name -> aggregate SQL expression
+    measures: tuple = ()
+
+    def select(self, where="", source=None):
+        keys = [f"{self.month} AS month", *(f"{expr} AS {name}" for name, expr in self.keys)]
+        measures = [f"{expr} AS {name}" for name, expr in self.measures]
+        group_by = ", ".join(str(i) for i in range(1, len(keys) + 1))
+        return f"SELECT {', '.join(keys + measures)} FROM {source or self.dataset} {where} GROUP BY {group_by}"
+
+    @property
+    def key_names(self):
+        return ["month", *(name for name, _ in self.keys)]
+
+
+ROLLUPS = {
+    rollup.name: rollup
+    for rollup in (
+        Rollup(
+            "ecommerce_monthly", "ecommerce", "DATE_TRUNC('month', Order_Date)",
+            measures=(
+                ("total_sales", "SUM(total_sales)"),
+                ("orders", "COUNT(*)"),
+            ),
+        ),
+        Rollup(
+            "financial_monthly", "financial", "DATE_TRUNC('month', date)",
+            measures=(
+                ("total_revenue", "SUM(revenue)"),
+                ("total_expenses", "SUM(expenses)"),
+                ("total_profit", "SUM(profit)"),
+            ),
+        ),
+        Rollup(
+            "social_media_user_monthly", "social_media", "post_month",
+            keys=(
+                ("username", "username"),
+                ("platform", "platform"),
+            ),
+            measures=(
+                ("posts", "COUNT(*)"),
+                ("interactions", "SUM(interactions)"),
+            ),
+        ),
+        # HyperLogLog sketches of the users, see utils.hll
+        Rollup(
+            "social_media_users_hll", "social_media", "post_month",
+            keys=(("platform", "platform"), *hll.sketch_keys("username")),
+            measures=hll.sketch_measures("username"),
+        ),
+        Rollup(
+            "social_media_hourly_hll", "social_media", "post_month",
+            keys=(("hour", "post_hour"), ("platform", "platform"), *hll.sketch_keys("username")),
+            measures=hll.sketch_measures("username"),
+        ),
+        Rollup(
+            "covid_monthly", "covid", "DATE_TRUNC('month', date)",
+            measures=(
+                ("total_new_cases", "SUM(new_cases)"),
+                ("total_new_deaths", "SUM(new_deaths)"),
+                ("total_new_recovered", "SUM(new_recovered)"),
+            ),
+        ),
+    )
+}
+
+
+def rollups_of(dataset):
+    return [rollup for rollup in ROLLUPS.values() if rollup.dataset == dataset]
+
+
+def materialise(con, dataset):
+    """Rebuild every rollup of ``dataset`` from its table."""
+    for rollup in rollups_of(dataset):
+        con.execute(f"CREATE OR REPLACE TABLE {rollup.name} AS {rollup.select()}")
+
+
+def _combine(expr, old, new):
+    """SQL folding the aggregate ``expr`` of new rows into a stored value, None if it cannot be."""
+    function = expr.split("(", 1)[0].strip().upper()
+    if "DISTINCT" in expr.upper():
+        return None
+    if function in ("SUM", "COUNT"):
+        return f"COALESCE({old} + {new}, {old}, {new})"
+    if function in ("MAX", "MIN"):
+        return f"{'GREATEST' if function == 'MAX' else 'LEAST'}({old}, {new})"
+    return None
+
+
+def refresh_months(con, dataset, delta, rollups=None):
+    """Recompute the months present in ``delta`` (rows already appended).
+
+    ``delta`` is a table or view with the columns of the dataset table.
+    """
+    for rollup in rollups or rollups_of(dataset):
+        months = f"SELECT DISTINCT {rollup.month} FROM {delta}"
+        con.execute(f"DELETE FROM {rollup.name} WHERE month IN ({months})")
+        con.execute(f"INSERT INTO {rollup.name} {rollup.select(f'WHERE {rollup.month} IN ({months})')}")
+
+
+def merge_delta(con, dataset, delta):
+    """Bring the rollups of ``dataset`` up to date with ``delta`` (rows already appended).
+
+    Only the groups present in ``delta`` change: the month, plus the
+    platform, user, hour... of rollups with more keys. Their measures are
+    folded together with the stored ones, groups seen for the first time
+    are inserted. Rollups with a measure that cannot be folded recompute
+    the months of ``delta`` instead.
+    """
+    for rollup in rollups_of(dataset):
+        combined = [(name, _combine(expr, f"r.{quote(name)}", f"d.{quote(name)}")) for name, expr in rollup.measures]
+        if any(expr is None for _, expr in combined):
+            refresh_months(con, dataset, delta, [rollup])
+            continue
+        con.execute(f"CREATE OR REPLACE TEMP TABLE _rollup_delta AS {rollup.select(source=delta)}")
+        match = " AND ".join(f"r.{quote(key)} IS NOT DISTINCT FROM d.{quote(key)}" for key in rollup.key_names)
+        assignments = ", ".join(f"{quote(name)} = {expr}" for name, expr in combined)
+        con.execute(f"UPDATE {rollup.name} AS r SET {assignments} FROM _rollup_delta AS d WHERE {match}")
+        con.execute(
+            f"INSERT INTO {rollup.name} SELECT d.* FROM _rollup_delta AS d "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {rollup.name} AS r WHERE {match})"
+        )
+        con.execute("DROP TABLE _rollup_delta")
@@ -0,0 +1,42 @@
+import functools
+import time
+
+import streamlit as st
+
+from utils.debug_panel import debug_requested
+from utils.tracing import span
+
+
+def section(func=None, *, name=None):
+    """Run a page section with widgets of its own as a Streamlit fragment.
+
+    A widget inside the section reruns only the section, the rest of the
+    page is left as it is. The queries that depend on the widgets run
+    inside the section so a change recomputes just them; inputs shared
+    with the rest of the page come from the query and figure caches.
+    Static blocks of a page are not sections, they never rerun alone.
+
+    Every run of the section is timed: the timings are kept in
+    ``st.session_state["section_timings"]``, shown under the section in
+    debug mode (see utils.debug_panel) and recorded as ``section`` spans
+    when tracing is on.
+    """
+    if func is None:
+        return functools.partial(section, name=name)
+    label = name or func.__name__
+
+    @st.fragment
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        start = time.perf_counter()
+        with span("section", label):
+            result = func(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+        timing = st.session_state.setdefault("section_timings", {}).setdefault(label, {"runs": 0})
+        timing["runs"] += 1
+        timing["last_ms"] = round(elapsed, 1)
+        if debug_requested():
+            st.caption(f"Section {label}: {elapsed:,.0f} ms (run {timing['runs']})")
+        return result
+
+    return run
@@ -0,0 +1,594 @@
+"""Seeded synthetic versions of the datasets, from thousands to hundreds of millions of rows.
+
+Every dataset keeps the columns of its csv, so the pages, the loaders and
+the benchmarks run on the generated files unchanged. Rows are made in
+chunks on a process pool. Each chunk has its own random stream derived
+from (seed, dataset, chunk), so a seed (and chunk size) always gives the
+same files whatever the number of workers. DuckDB writes every chunk as a part file
+and the parts are joined in order.
+
+Usage:
+    python -m utils.synthetic --rows 1M --out /tmp/data
+    python -m utils.synthetic --rows 100M --format parquet --out /tmp/data ecommerce covid
+
+With ``--format parquet`` the parts are cleaned like the csv would be and
+written as the typed copies the app reads (``<out>/parquet``, see
+utils.build_parquet); point ``PORTFOLIO_DATA_DIR`` at ``--out`` to use them.
+
+The distributions follow the real data rather than the uniform samples:
+
+* ecommerce: repeat customers and best selling products (Zipf), a
+  catalogue of categories with their own price ranges, more orders over
+  time and at the end of the year, delivery delays skewed towards a few
+  days, card payments ahead of PayPal and cash, about 10% missing values
+  per column like the original export.
+* financial: daily 2023 revenue with a seasonal swing, expenses following
+  revenue, profit as their difference.
+* social_media: Zipfian usernames (a few heavy posters, a long tail),
+  users mostly posting on one platform, posting hours peaking at lunch
+  and in the evening, heavy tailed likes growing with the user's reach.
+* covid: the 34 provinces with their ISO codes, island, population
+  density and coordinates, daily cases following the national waves
+  (early 2021, Delta in July 2021, Omicron in February 2022, smaller
+  bumps after each Eid), deaths and recoveries lagging the cases, plus
+  one country level row per day. Past 34 provinces x 929 days, extra
+  locations are split off the provinces around their coordinates; below
+  that the file covers fewer days, from March 2020 on.
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from utils.datasets import DATASETS
+from utils.ingest import _literal
+
+CHUNK_ROWS = 500_000
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def parse_rows(text):
+    """``10000``, ``10k``, ``2.5M`` or ``1e8`` as a number of rows."""
+    text = str(text).strip().lower().replace("_", "")
+    factor = {"k": 1_000, "m": 1_000_000, "b": 1_000_000_000}.get(text[-1:], 1)
+    if factor > 1:
+        text = text[:-1]
+    return int(float(text) * factor)
+
+
+# --- shared helpers ---
+
+
+def _mix(x):
+    """splitmix64 of every value of a uint64 array, a stable hash."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# positions of the hex digits in the 36 character form, the rest are dashes
+_UUID_DIGITS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+
+def uuid_strings(keys, seed, salt):
+    """Version 4 UUID strings derived from integer ``keys``, the same key gives the same UUID."""
+    import pyarrow as pa
+
+    keys = np.asarray(keys, dtype=np.uint64) ^ _mix(np.array([seed * 1_000_003 + salt], dtype=np.uint64))
+    raw = np.stack([_mix(keys), _mix(keys ^ np.uint64(0xA5A5A5A5A5A5A5A5))], axis=1).view(np.uint8).reshape(-1, 16)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    digits = np.empty((len(raw), 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    text = np.full((len(raw), 36), ord("-"), dtype=np.uint8)
+    text[:, _UUID_DIGITS] = digits
+    return pa.array(text.view("S36").ravel()).cast(pa.string())
+
+
+def zipf_ranks(rng, n, size, s):
+    """Ranks in ``[0, n)`` with P(rank k) proportional to 1 / (k + 1) ** s."""
+    a = 1.0 - s
+    u = rng.random(size)
+    x = (1.0 + u * ((n + 1.0) ** a - 1.0)) ** (1.0 / a)
+    return np.minimum(x.astype(np.int64) - 1, n - 1)
+
+
+def pick(values, indices, mask=None):
+    """Text column of ``values[indices]`` kept as a dictionary, nulls where ``mask``."""
+    import pyarrow as pa
+
+    return pa.DictionaryArray.from_arrays(
+        masked(indices.astype(np.int32), mask), pa.array(values, type=pa.string())
+    )
+
+
+def masked(values, mask):
+    """Arrow column of ``values`` with nulls where ``mask``, without a pass through Python objects."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values)
+    if mask is None:
+        return values
+    # pa.array() of a NumPy bool array packs the bits one by one, packbits is vectorised
+    bits = pa.py_buffer(np.packbits(mask, bitorder="little"))
+    return pc.if_else(pa.Array.from_buffers(pa.bool_(), len(mask), [None, bits]), pa.scalar(None, values.type), values)
+
+
+def weighted_days(rng, start, days, weights, size):
+    return np.datetime64(start, "D") + rng.choice(days, size=size, p=weights / weights.sum())
+
+
+# --- ecommerce ---
+
+_CATEGORIES = (
+    # name, share of the catalogue, median price
+    ("Electronics", 0.16, 320.0),
+    ("Fashion", 0.20, 45.0),
+    ("Home & Kitchen", 0.14, 70.0),
+    ("Beauty", 0.10, 25.0),
+    ("Sports", 0.08, 60.0),
+    ("Books", 0.09, 15.0),
+    ("Toys", 0.07, 30.0),
+    ("Groceries", 0.08, 12.0),
+    ("Automotive", 0.04, 110.0),
+    ("Health", 0.04, 35.0),
+)
+_ADJECTIVES = (
+    "Classic", "Smart", "Portable", "Premium", "Eco", "Compact", "Deluxe", "Wireless", "Organic", "Ultra",
+    "Mini", "Pro", "Essential", "Vintage", "Modern", "Everyday", "Travel", "Family", "Outdoor", "Soft",
+)
+# the noun at position i belongs to category i % 10
+_NOUNS = (
+    "Speaker", "Jacket", "Blender", "Serum", "Racket", "Novel", "Puzzle", "Coffee", "Charger", "Vitamins",
+    "Headphones", "Sneakers", "Pan", "Lipstick", "Bottle", "Cookbook", "Robot", "Tea", "Tyre", "Mask",
+    "Watch", "Dress", "Lamp", "Shampoo", "Yoga Mat", "Atlas", "Blocks", "Rice", "Wiper", "Thermometer",
+)
+_PAYMENTS = ("Credit Card", "PayPal", "Cash")
+_PAYMENT_SHARE = np.array([0.52, 0.31, 0.17])
+# days between order and delivery, 0 is same day
+_DELAY_SHARE = np.array([0.12, 0.24, 0.21, 0.14, 0.10, 0.07, 0.05, 0.03, 0.02, 0.02])
+_ECOMMERCE_NULLS = 0.1
+
+
+def _catalogue(seed, products):
+    """Category, name and price of every product, the same in every worker."""
+    rng = np.random.default_rng([seed, 0, products])
+    shares = np.array([share for _, share, _ in _CATEGORIES])
+    category = rng.choice(len(_CATEGORIES), size=products, p=shares / shares.sum())
+    median = np.array([price for _, _, price in _CATEGORIES])[category]
+    price = np.clip(np.round(median * rng.lognormal(0.0, 0.6, products), 2), 10.0, 999.99)
+    noun = category + len(_CATEGORIES) * rng.integers(0, len(_NOUNS) // len(_CATEGORIES), products)
+    name = rng.integers(0, len(_ADJECTIVES), products) * len(_NOUNS) + noun
+    return category, name, price
+
+
+def ecommerce(rng, start, stop, total, seed):
+    import pyarrow as pa
+
+    n = stop - start
+    customers = max(1_000, total // 4)
+    products = int(np.clip(total // 20, 500, 200_000))
+    category, name, price = _catalogue(seed, products)
+
+    customer = zipf_ranks(rng, customers, n, 1.05)
+    product = zipf_ranks(rng, products, n, 1.2)
+
+    days = (np.datetime64("2023-12-01") - np.datetime64("2020-01-01")).astype(int) + 1
+    calendar = np.datetime64("2020-01-01") + np.arange(days)
+    months = (calendar.astype("datetime64[M]").astype(int) % 12) + 1
+    # steady growth, busy November and December, quieter weekends
+    weights = (1.0 + 0.6 * np.arange(days) / days) * np.where(months >= 11, 1.35, 1.0)
+    weights *= np.where(((calendar - _EPOCH).astype(int) + 3) % 7 >= 5, 0.85, 1.0)
+    ordered = weighted_days(rng, "2020-01-01", days, weights, n)
+    delivered = ordered + rng.choice(len(_DELAY_SHARE), size=n, p=_DELAY_SHARE)
+    quantity = np.minimum(rng.geometric(0.28, n), 10).astype(np.float64)
+
+    null = lambda: rng.random(n) < _ECOMMERCE_NULLS
+    no_order_date = null()
+    names = [f"{a} {b}" for a in _ADJECTIVES for b in _NOUNS]
+    return pa.table({
+        "Order_ID": masked(uuid_strings(np.arange(start, stop), seed, 1), null()),
+        "Customer_ID": masked(uuid_strings(customer, seed, 2), null()),
+        "Product_ID": masked(uuid_strings(product, seed, 3), null()),
+        "Product_Name": pick(names, name[product], null()),
+        "Category": pick([c for c, _, _ in _CATEGORIES], category[product], null()),
+        "Price": masked(price[product], null()),
+        "Quantity": masked(quantity, null()),
+        "Order_Date": masked(ordered, no_order_date),
+        # a missing order date leaves the delivery date unknown too
+        "Delivery_Date": masked(delivered, no_order_date | null()),
+        "Payment_Method": pick(_PAYMENTS, rng.choice(3, size=n, p=_PAYMENT_SHARE), null()),
+    })
+
+
+# --- financial ---
+
+
+def financial(rng, start, stop, total, seed):
+    import pyarrow as pa
+
+    n = stop - start
+    day = rng.integers(0, 365, n)
+    # revenue peaks in the last quarter and dips mid year
+    season = 1.0 + 0.18 * np.cos(2 * np.pi * (day - 340) / 365)
+    revenue = np.clip(np.rint(12_000 * season * rng.lognormal(0.0, 0.3, n)), 5_000, 19_999).astype(np.int64)
+    expenses = np.clip(np.rint(0.45 * revenue + rng.normal(600, 1_400, n)), 2_000, 9_999).astype(np.int64)
+    return pa.table({
+        "Date": pa.array(np.datetime64("2023-01-01") + day),
+        "Revenue": revenue,
+        "Expenses": expenses,
+        "Profit": revenue - expenses,
+    })
+
+
+# --- social media ---
+
+_PLATFORMS = ("Instagram", "Facebook", "Twitter")
+_PLATFORM_SHARE = np.array([0.38, 0.34, 0.28])
+# posts per hour of the day, lunch and evening peaks
+_HOUR_SHARE = np.array([
+    1.2, 0.8, 0.5, 0.4, 0.4, 0.6, 1.2, 2.4, 3.2, 3.4, 3.6, 4.2,
+    5.2, 5.0, 4.2, 4.0, 4.2, 4.8, 5.6, 6.6, 7.2, 6.8, 5.0, 2.8,
+])
+_FIRST = (
+    "james", "mary", "john", "linda", "robert", "susan", "michael", "karen", "david", "lisa", "william", "nancy",
+    "richard", "betty", "joseph", "sandra", "thomas", "ashley", "charles", "emily", "chris", "kayla", "daniel",
+    "sarah", "matthew", "laura", "anthony", "amy", "mark", "angela", "steven", "megan", "paul", "rachel", "andrew",
+)
+_LAST = (
+    "smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez", "martinez",
+    "hernandez", "lopez", "wilson", "anderson", "thomas", "taylor", "moore", "jackson", "martin", "lee",
+    "perez", "thompson", "white", "harris", "sanchez", "clark", "lewis", "robinson", "walker", "young", "allen",
+    "king", "wright", "scott", "torres", "nguyen", "hill", "flores", "green", "adams", "nelson", "baker",
+)
+_WORDS = (
+    "today", "new", "great", "team", "weekend", "coffee", "music", "travel", "love", "work", "city", "morning",
+    "launch", "friends", "photo", "story", "learn", "goal", "summer", "market", "idea", "project", "run", "food",
+    "share", "happy", "tips", "week", "live", "video", "event", "night", "game", "design", "health", "future",
+)
+
+
+def _usernames(ranks):
+    first, combos = len(_FIRST), len(_FIRST) * len(_LAST)
+    names = []
+    for rank in ranks.tolist():
+        # 7919 is prime, so the first names * last names ranks map to distinct pairs
+        combo = rank * 7919 % combos
+        name = _FIRST[combo % first] + _LAST[combo // first]
+        number = rank // combos
+        names.append(f"{name}{number}" if number else name)
+    return names
+
+
+def _sentences(seed, count):
+    rng = np.random.default_rng([seed, 3, count])
+    sentences = []
+    for length in rng.integers(4, 10, count):
+        words = [_WORDS[i] for i in rng.integers(0, len(_WORDS), length)]
+        sentences.append(" ".join(words).capitalize() + ".")
+    return sentences
+
+
+def social_media(rng, start, stop, total, seed):
+    import pyarrow as pa
+
+    n = stop - start
+    users = max(1_000, total // 3)
+    user = zipf_ranks(rng, users, n, 1.1)
+    unique, inverse = np.unique(user, return_inverse=True)
+
+    # every user has a home platform, most of their posts go there
+    home = _mix(user.astype(np.uint64) + np.uint64(seed)) % np.uint64(1000) / 1000.0
+    home = np.searchsorted(np.cumsum(_PLATFORM_SHARE), home, side="right").clip(0, 2)
+    platform = np.where(rng.random(n) < 0.75, home, rng.choice(3, size=n, p=_PLATFORM_SHARE))
+
+    day = rng.integers(0, 365, n)
+    seconds = rng.choice(24, size=n, p=_HOUR_SHARE / _HOUR_SHARE.sum()) * 3600 + rng.integers(0, 3600, n)
+    posted = (np.datetime64("2022-12-04") + day).astype("datetime64[s]") + seconds
+
+    # heavy posters (low ranks) reach more people
+    reach = 0.35 * np.log(users / (user + 1.0)) / np.log(users)
+    likes = np.rint(rng.lognormal(4.3 + reach, 0.7)).astype(np.int64) + 5
+    comments = rng.binomial(likes, 0.12) + 1
+    shares = rng.binomial(likes, 0.07) + 1
+
+    sentences = _sentences(seed, 4_096)
+    return pa.table({
+        "id": np.arange(start + 1, stop + 1),
+        "platform": pick(_PLATFORMS, platform),
+        "username": pick(_usernames(unique), inverse),
+        "post_date": pa.array(posted),
+        "content": pick(sentences, rng.integers(0, len(sentences), n)),
+        "likes": likes,
+        "comments": comments,
+        "shares": shares,
+    })
+
+
+# --- covid ---
+
+_PROVINCES = (
+    # ISO code, name, island, population density, longitude, latitude, special status, share of the cases
+    ("ID-AC", "Aceh", "Sumatera", 90.0, 96.9, 4.2, "Daerah Istimewa", 0.6),
+    ("ID-SU", "Sumatera Utara", "Sumatera", 199.0, 99.1, 2.2, None, 2.4),
+    ("ID-SB", "Sumatera Barat", "Sumatera", 131.0, 100.5, -0.7, None, 1.7),
+    ("ID-RI", "Riau", "Sumatera", 77.0, 101.8, 0.3, None, 2.3),
+    ("ID-KR", "Kepulauan Riau", "Sumatera", 264.0, 104.5, 0.9, None, 1.0),
+    ("ID-JA", "Jambi", "Sumatera", 73.0, 103.0, -1.6, None, 0.6),
+    ("ID-SS", "Sumatera Selatan", "Sumatera", 94.0, 104.2, -3.3, None, 1.2),
+    ("ID-BB", "Kepulauan Bangka Belitung", "Sumatera", 85.0, 106.4, -2.7, None, 0.7),
+    ("ID-BE", "Bengkulu", "Sumatera", 99.0, 102.3, -3.8, None, 0.4),
+    ("ID-LA", "Lampung", "Sumatera", 246.0, 105.3, -4.9, None, 0.9),
+    ("ID-JK", "DKI Jakarta", "Jawa", 16334.0, 106.8, -6.2, "Daerah Khusus Ibu Kota", 21.5),
+    ("ID-JB", "Jawa Barat", "Jawa", 1394.0, 107.6, -6.9, None, 18.7),
+    ("ID-BT", "Banten", "Jawa", 1338.0, 106.1, -6.4, None, 5.0),
+    ("ID-JT", "Jawa Tengah", "Jawa", 1113.0, 110.2, -7.2, None, 9.8),
+    ("ID-YO", "Daerah Istimewa Yogyakarta", "Jawa", 1221.0, 110.4, -7.9, "Daerah Istimewa", 3.5),
+    ("ID-JI", "Jawa Timur", "Jawa", 833.0, 112.7, -7.5, None, 9.5),
+    ("ID-BA", "Bali", "Nusa Tenggara", 749.0, 115.1, -8.4, None, 2.6),
+    ("ID-NB", "Nusa Tenggara Barat", "Nusa Tenggara", 283.0, 117.4, -8.7, None, 0.6),
+    ("ID-NT", "Nusa Tenggara Timur", "Nusa Tenggara", 111.0, 121.1, -8.7, None, 1.0),
+    ("ID-KB", "Kalimantan Barat", "Kalimantan", 37.0, 111.5, -0.1, None, 0.7),
+    ("ID-KT", "Kalimantan Tengah", "Kalimantan", 18.0, 113.4, -1.7, None, 0.8),
+    ("ID-KS", "Kalimantan Selatan", "Kalimantan", 112.0, 115.3, -3.1, None, 1.2),
+    ("ID-KI", "Kalimantan Timur", "Kalimantan", 30.0, 116.4, 0.5, None, 3.3),
+    ("ID-KU", "Kalimantan Utara", "Kalimantan", 10.0, 116.0, 3.1, None, 0.5),
+    ("ID-SA", "Sulawesi Utara", "Sulawesi", 188.0, 124.5, 0.6, None, 0.8),
+    ("ID-ST", "Sulawesi Tengah", "Sulawesi", 48.0, 121.4, -1.4, None, 0.8),
+    ("ID-SN", "Sulawesi Selatan", "Sulawesi", 196.0, 119.9, -3.7, None, 2.3),
+    ("ID-SG", "Sulawesi Tenggara", "Sulawesi", 70.0, 122.1, -4.1, None, 0.4),
+    ("ID-GO", "Gorontalo", "Sulawesi", 106.0, 122.4, 0.7, None, 0.2),
+    ("ID-SR", "Sulawesi Barat", "Sulawesi", 82.0, 119.2, -2.8, None, 0.2),
+    ("ID-MA", "Maluku", "Maluku", 39.0, 129.9, -3.2, None, 0.3),
+    ("ID-MU", "Maluku Utara", "Maluku", 39.0, 127.8, 1.6, None, 0.2),
+    ("ID-PA", "Papua", "Papua", 10.0, 138.1, -4.3, "Otonomi Khusus", 0.8),
+    ("ID-PB", "Papua Barat", "Papua", 9.0, 133.2, -1.3, "Otonomi Khusus", 0.5),
+)
+_COVID_START = np.datetime64("2020-03-01")
+_COVID_DAYS = (np.datetime64("2022-09-15") - _COVID_START).astype(int) + 1
+_COVID_COLUMNS = (
+    "Date", "Location ISO Code", "Location", "New Cases", "New Deaths", "New Recovered", "Total Cases",
+    "Location Level", "City or Regency", "Province", "Country", "Continent", "Island", "Special Status",
+    "Population Density", "Longitude", "Latitude",
+)
+
+
+def _days_since_start(date):
+    return (np.datetime64(date) - _COVID_START).astype(int)
+
+
+def national_cases():
+    """Expected daily new cases in Indonesia, day 0 is 2020-03-01."""
+    t = np.arange(_COVID_DAYS, dtype=np.float64)
+    wave = lambda peak, height, width: height * np.exp(-0.5 * ((t - _days_since_start(peak)) / width) ** 2)
+    # slow build up through 2020, fading once the waves take over
+    base = 4_000 / (1 + np.exp(-(t - 200) / 35)) * np.clip(1.3 - t / 900, 0.3, 1.0)
+    cases = (
+        base
+        + wave("2021-01-30", 8_000, 45)
+        + wave("2021-07-15", 45_000, 16)  # Delta
+        + wave("2022-02-16", 55_000, 14)  # Omicron
+        + wave("2022-08-10", 5_000, 20)
+    )
+    # travel after Eid shows up a couple of weeks later
+    for eid in ("2020-05-24", "2021-05-13", "2022-05-02"):
+        cases *= 1 + 0.35 * np.exp(-0.5 * ((t - _days_since_start(eid) - 14) / 5) ** 2)
+    # fewer tests are reported on Sundays
+    weekday = (t.astype(np.int64) + int((_COVID_START - _EPOCH).astype(int)) + 3) % 7
+    return np.where(weekday == 6, 0.8, 1.0) * np.maximum(cases, 1.0)
+
+
+def _lagged(values, days):
+    out = np.zeros_like(values)
+    out[..., days:] = values[..., :-days]
+    return out
+
+
+def _covid_layout(rows):
+    """``(locations, days)`` of a covid file of at most ``rows`` rows (at least 35).
+
+    Small files keep every province and the country row but cover fewer
+    days, larger ones cover every day with more locations.
+    """
+    days = min(_COVID_DAYS, max(1, rows // (len(_PROVINCES) + 1)))
+    return max(len(_PROVINCES), rows // days - 1), days
+
+
+def _per_day(values, days):
+    """Text column repeating every location's value over ``days`` days, ``None`` as null."""
+    indices = np.repeat(np.arange(len(values)), days)
+    missing = np.array([value is None for value in values])
+    return pick([value or "" for value in values], indices, missing[indices] if missing.any() else None)
+
+
+def _covid_table(rng, locations, cases):
+    """Rows of ``cases`` (locations x days) with the attributes of every location."""
+    import pyarrow as pa
+
+    count, days = cases.shape
+    deaths_rate = np.where(np.arange(days) < _days_since_start("2022-01-01"), 0.028, 0.006)
+    deaths = rng.binomial(_lagged(cases, 10), deaths_rate)
+    recovered = rng.binomial(_lagged(cases, 14), 0.96)
+    per_day = lambda values: _per_day(values, days)
+    repeat = lambda values: np.repeat(np.asarray(values, dtype=np.float64), days)
+    table = {
+        "Date": np.tile(_COVID_START + np.arange(days), count),
+        "Location ISO Code": per_day(locations["iso"]),
+        "Location": per_day(locations["name"]),
+        "New Cases": cases.ravel(),
+        "New Deaths": deaths.ravel(),
+        "New Recovered": recovered.ravel(),
+        "Total Cases": np.cumsum(cases, axis=1).ravel(),
+        "Location Level": per_day(locations["level"]),
+        "City or Regency": pa.nulls(cases.size, pa.string()),
+        "Province": per_day(locations["province"]),
+        "Country": per_day(["Indonesia"] * count),
+        "Continent": per_day(["Asia"] * count),
+        "Island": per_day(locations["island"]),
+        "Special Status": per_day(locations["special"]),
+        "Population Density": repeat(locations["density"]),
+        "Longitude": repeat(locations["longitude"]),
+        "Latitude": repeat(locations["latitude"]),
+    }
+    return pa.table({name: table[name] for name in _COVID_COLUMNS})
+
+
+def covid(rng, start, stop, total, seed):
+    """Locations ``start`` to ``stop`` over every day, the country rows go with the first chunk."""
+    import pyarrow as pa
+
+    units, days = _covid_layout(total)
+    national = national_cases()
+    index = np.arange(start, stop)
+    province = index % len(_PROVINCES)
+    copy = index // len(_PROVINCES)
+    iso, names, island, density, longitude, latitude, special, share = zip(*_PROVINCES)
+    share = np.array(share) / sum(share)
+
+    # extra locations sit around their province, with a density of the same order
+    jitter = rng.normal(0.0, 0.35, (len(index), 2)) * (copy > 0)[:, None]
+    spread = np.where(copy > 0, rng.lognormal(0.0, 0.3, len(index)), 1.0)
+    suffix = lambda value, c: f"{value} {c + 1}" if c else value
+    location_names = [suffix(names[p], c) for p, c in zip(province, copy)]
+    locations = {
+        "iso": [f"{iso[p]}-{c + 1}" if c else iso[p] for p, c in zip(province, copy)],
+        "name": location_names,
+        "level": ["Province"] * len(index),
+        "province": location_names,
+        "island": [island[p] for p in province],
+        "special": [special[p] for p in province],
+        "density": np.round(np.array(density)[province] * spread, 1),
+        "longitude": np.array(longitude)[province] + jitter[:, 0],
+        "latitude": np.array(latitude)[province] + jitter[:, 1],
+    }
+
+    # each location follows the national curve a few days early or late,
+    # with day to day noise on top (a gamma-Poisson mix) and its share of
+    # the country's cases,
+    # with the province split across its locations
+    copies = units // len(_PROVINCES) + (province < units % len(_PROVINCES))
+    shift = rng.integers(-7, 8, len(index))
+    expected = np.stack([np.roll(national, s)[:days] for s in shift]) * (share[province] / copies)[:, None]
+    cases = rng.poisson(expected * rng.gamma(20.0, 1 / 20.0, expected.shape))
+    table = _covid_table(rng, locations, cases)
+    if start:
+        return table
+
+    country = {
+        "iso": ["IDN"], "name": ["Indonesia"], "level": ["Country"], "province": [None], "island": [None],
+        "special": [None], "density": [142.0], "longitude": [113.9], "latitude": [-0.8],
+    }
+    return pa.concat_tables([_covid_table(rng, country, rng.poisson(national[:days])[None, :]), table])
+
+
+# --- writing ---
+
+
+@dataclass(frozen=True)
+class Generator:
+    make: object
+    # DuckDB DATEFORMAT of the csv, the original files differ
+    date_format: str = "%Y-%m-%d"
+    # rows -> (units of work, rows per unit), covid makes a whole location
+    # at a time; None is one row per unit
+    layout: object = None
+
+
+GENERATORS = {
+    "ecommerce": Generator(ecommerce),
+    "financial": Generator(financial),
+    "social_media": Generator(social_media),
+    "covid": Generator(covid, date_format="%-m/%-d/%Y", layout=_covid_layout),
+}
+
+
+def _write_part(name, seed, chunk, start, stop, total, path, fmt):
+    import duckdb
+
+    generator = GENERATORS[name]
+    rng = np.random.default_rng([seed, list(GENERATORS).index(name), chunk])
+    table = generator.make(rng, start, stop, total, seed)
+    # the parallelism comes from the processes, one DuckDB thread each
+    con = duckdb.connect(config={"threads": 1})
+    con.register("part", table)
+    if fmt == "csv":
+        options = f"FORMAT csv, HEADER {'true' if chunk == 0 else 'false'}, DATEFORMAT '{generator.date_format}'"
+    else:
+        options = "FORMAT parquet"
+    con.execute(f"COPY part TO {_literal(path)} ({options})")
+    con.close()
+    return table.num_rows
+
+
+def generate(name, rows, out, fmt="csv", seed=42, workers=None, chunk_rows=CHUNK_ROWS):
+    """Write ``rows`` synthetic rows of dataset ``name`` under ``out``, returns the path and row count."""
+    spec = DATASETS[name]
+    generator = GENERATORS[name]
+    out = Path(out)
+    units, rows_per_unit = generator.layout(rows) if generator.layout else (rows, 1)
+    per_chunk = max(1, chunk_rows // rows_per_unit)
+
+    parts_dir = out / f".{name}.parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir(parents=True)
+    suffix = "csv" if fmt == "csv" else "parquet"
+    chunks = [(i, start, min(start + per_chunk, units)) for i, start in enumerate(range(0, units, per_chunk))]
+    parts = [parts_dir / f"part-{i:05d}.{suffix}" for i, _, _ in chunks]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(_write_part, name, seed, i, start, stop, rows, path, fmt)
+            for (i, start, stop), path in zip(chunks, parts)
+        ]
+        written = sum(future.result() for future in futures)
+
+    if fmt == "csv":
+        target = out / spec.filename
+        tmp_path = target.with_suffix(".csv.tmp")
+        with open(tmp_path, "wb") as handle:
+            for path in parts:
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, handle, 16 * 1024 * 1024)
+        tmp_path.replace(target)
+    else:
+        from utils.build_parquet import build
+
+        target = out / "parquet" / f"{name}.parquet"
+        files = ", ".join(_literal(path) for path in parts)
+        build(name, scan=f"read_parquet([{files}])", target=target)
+    shutil.rmtree(parts_dir)
+    return target, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write seeded synthetic copies of the datasets.")
+    parser.add_argument("datasets", nargs="*", help=f"any of {', '.join(GENERATORS)} (default: all)")
+    parser.add_argument("--rows", type=parse_rows, default=parse_rows("10k"), help="rows per dataset, e.g. 10k, 1M, 100M")
+    parser.add_argument("--out", type=Path, required=True, help="folder the csv files (or parquet/) are written to")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="processes, default one per core")
+    parser.add_argument("--chunk-rows", type=parse_rows, default=CHUNK_ROWS, help="rows per part file")
+    args = parser.parse_args(argv)
+    unknown = set(args.datasets) - set(GENERATORS)
+    if unknown:
+        parser.error(f"unknown dataset: {', '.join(sorted(unknown))}")
+
+    for name in args.datasets or GENERATORS:
+        start = time.perf_counter()
+        target, rows = generate(name, args.rows, args.out, args.format, args.seed, args.workers, args.chunk_rows)
+        print(f"{name}: {rows:,} rows -> {target} ({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
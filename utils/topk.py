@@ -0,0 +1,204 @@
+"""Top users by interactions kept in memory, per month and platform.
+
+Every (month, platform) has a Space-Saving summary (Metwally et al.,
+2005) of at most ``TOPK_CAPACITY`` users with their interactions:
+
+* it is seeded from one DuckDB pass over the table, which keeps the
+  heaviest users of every month and platform exactly;
+* appended posts update it in place (see ``QueryEngine.on_append``): a
+  tracked user adds to its count, a new user takes the place of the
+  lightest one and inherits its count as the possible overestimate.
+
+Any user missing from a summary has at most the summary's lightest count
+there, so merging the summaries of a range of months and a set of
+platforms gives upper bounds with a known error. While no summary has
+overflowed (fewer users than the capacity in every month and platform)
+the ranking is exactly the one of the GROUP BY query.
+"""
+import heapq
+import itertools
+import os
+import threading
+
+from utils.query import engine
+from utils.tracing import span
+
+# Users tracked per month and platform
+TOPK_CAPACITY = int(os.environ.get("PORTFOLIO_TOPK_CAPACITY", "1000"))
+
+
+class SpaceSaving:
+    """Weighted Space-Saving summary of the heaviest keys of a stream."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # key -> [count, error, first seen]; count - error <= true count <= count
+        self.counters = {}
+        # (count, key) entries, stale ones are skipped when popped
+        self._heap = []
+
+    @classmethod
+    def from_totals(cls, capacity, keys, totals, firsts):
+        """Summary holding the exact ``totals`` of the (at most ``capacity``) heaviest keys."""
+        summary = cls(capacity)
+        for key, total, first in zip(keys, totals, firsts):
+            summary.counters[key] = [total, 0, first]
+        summary._heap = [(counter[0], key) for key, counter in summary.counters.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+    @property
+    def floor(self):
+        """Highest possible count of a key the summary does not hold."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return self._min()[0]
+
+    def _min(self):
+        while True:
+            count, key = self._heap[0]
+            counter = self.counters.get(key)
+            if counter is not None and counter[0] == count:
+                return count, key
+            heapq.heappop(self._heap)
+
+    def add(self, key, weight, first=None):
+        counter = self.counters.get(key)
+        if counter is None and len(self.counters) >= self.capacity:
+            # the lightest key makes room, the new one inherits its count
+            floor, evicted = self._min()
+            del self.counters[evicted]
+            counter = self.counters[key] = [floor, floor, first]
+        elif counter is None:
+            counter = self.counters[key] = [0, 0, first]
+        counter[0] += weight
+        if first is not None and (counter[2] is None or first < counter[2]):
+            counter[2] = first
+        heapq.heappush(self._heap, (counter[0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c[0], k) for k, c in self.counters.items()]
+            heapq.heapify(self._heap)
+
+
+def top_query(where="", n=10):
+    """SQL of the ``n`` users with the most interactions in the posts ``where`` keeps.
+
+    The exact counterpart of ``Influencers.top`` for any filter, with the
+    same columns and rules: ``Date`` is the user's first post, platforms
+    are listed in order and ties go to the first username.
+    """
+    return f"""
+    SELECT
+        username,
+        MIN(post_date) AS Date,
+        STRING_AGG(DISTINCT CAST(platform AS VARCHAR), ',' ORDER BY CAST(platform AS VARCHAR)) AS platforms,
+        CAST(SUM(interactions) AS BIGINT) AS total_interactions
+    FROM social_media
+    {where}
+    GROUP BY username
+    HAVING COUNT(DISTINCT platform) > 0
+    ORDER BY total_interactions DESC, username
+    LIMIT {int(n)}
+    """
+
+
+class Influencers:
+    """Space-Saving summaries of the users of ``social_media`` per (month, platform)."""
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.summaries = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    def _totals(self, source):
+        """(month, platform, username, interactions, first post) of the posts of ``source``."""
+        return f"""
+        SELECT post_month AS month, platform, username, CAST(SUM(interactions) AS BIGINT) AS total, MIN(post_date) AS first
+        FROM {source}
+        WHERE username IS NOT NULL AND platform IS NOT NULL
+        GROUP BY ALL
+        """
+
+    def build(self, version):
+        """Seed every summary from the table, exact up to the capacity."""
+        # straight on a cursor: sql() may wait for the engine lock, which an
+        # append holds while it waits for ours in update()
+        rows = engine.cursor().execute(
+            f"""
+            SELECT * FROM ({self._totals('social_media')})
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY month, platform ORDER BY total DESC, username) <= {self.capacity}
+            ORDER BY month, platform
+            """
+        ).fetchall()
+        self.summaries = {
+            group: SpaceSaving.from_totals(self.capacity, *zip(*(row[2:] for row in members)))
+            for group, members in itertools.groupby(rows, key=lambda row: row[:2])
+        }
+        self.version = version
+
+    def update(self, con, delta):
+        """Add the posts of ``delta`` (appended rows of ``social_media``)."""
+        with self._lock:
+            if self.version is None:
+                # nothing built yet, the first read sees the appended rows
+                return
+            for month, platform, username, total, first in con.execute(self._totals(delta)).fetchall():
+                summary = self.summaries.setdefault((month, platform), SpaceSaving(self.capacity))
+                summary.add(username, total, first)
+            file_version, appended = self.version
+            self.version = (file_version, appended + 1)
+
+    def top(self, n=10, start=None, end=None, platforms=()):
+        """The ``n`` users with the most interactions in whole months ``start`` to ``end``.
+
+        ``start``/``end`` are dates (``None`` leaves the range open) and
+        ``platforms`` a selection, empty for every platform. Returns
+        ``(table, error)``: an Arrow table shaped like ``top_query``
+        (username, Date, platforms, total_interactions) and the highest
+        possible overestimate of the counts shown, 0 when they are exact.
+        """
+        import pyarrow as pa
+
+        with span("query", "top influencers (in memory)") as trace:
+            version = engine.ensure_table("social_media")
+            with self._lock:
+                if self.version != version:
+                    self.build(version)
+                selected = [
+                    (platform, summary) for (month, platform), summary in self.summaries.items()
+                    if (start is None or month.date() >= start.replace(day=1))
+                    and (end is None or month.date() <= end)
+                    and (not platforms or platform in platforms)
+                ]
+                # a user may still have up to a summary's floor where it is
+                # not tracked, counts start from all the floors and swap a
+                # floor for the tracked count wherever the user is held
+                floors = sum(summary.floor for _, summary in selected)
+                merged = {}
+                for platform, summary in selected:
+                    floor = summary.floor
+                    for user, (count, error, first) in summary.counters.items():
+                        entry = merged.get(user)
+                        if entry is None:
+                            entry = merged[user] = [floors, floors, first, set()]
+                        entry[0] += count - floor
+                        entry[1] += error - floor
+                        entry[2] = min(entry[2], first)
+                        entry[3].add(platform)
+
+            ranked = sorted(merged.items(), key=lambda item: (-item[1][0], item[0]))[:n]
+            table = pa.table({
+                "username": [user for user, _ in ranked],
+                "Date": pa.array([entry[2] for _, entry in ranked], type=pa.timestamp("us")),
+                "platforms": [",".join(sorted(entry[3])) for _, entry in ranked],
+                "total_interactions": pa.array([entry[0] for _, entry in ranked], type=pa.int64()),
+            })
+            error = max((entry[1] for _, entry in ranked), default=0)
+            if trace.recording:
+                trace.set(rows_in=sum(len(summary.counters) for _, summary in selected), rows_out=table.num_rows, cached=True)
+            return table, error
+
+
+influencers = Influencers()
+engine.on_append("social_media", influencers.update)
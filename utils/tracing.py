@@ -0,0 +1,146 @@
+"""Timed spans around the loads, queries and charts of the shared helpers.
+
+Tracing is off by default and ``span()`` then hands back one shared no-op
+object, so an instrumented call costs a global lookup and a function
+call. Turn it on for every session with ``PORTFOLIO_TRACE=1`` or from the
+debug panel of a server started with ``PORTFOLIO_DEBUG=1``. A run started
+with ``start_run(record=True)`` records its own spans while tracing is
+off, that is how ``?debug=1`` in the url traces a single session.
+
+Every span records its kind (``load``, ``query``, ``chart``), a name, the
+duration, the rows going in and out, the bytes produced and whether it
+was served from a cache. Spans are kept in a bounded in-memory buffer
+and can be exported as JSON lines.
+"""
+import collections
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+
+# Number of spans kept in memory, oldest are dropped first
+TRACE_BUFFER = int(os.environ.get("PORTFOLIO_TRACE_BUFFER", "5000"))
+
+_enabled = os.environ.get("PORTFOLIO_TRACE", "") not in ("", "0")
+_spans = collections.deque(maxlen=TRACE_BUFFER)
+_lock = threading.Lock()
+_local = threading.local()
+_runs = itertools.count(1)
+
+
+class _NullSpan:
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    recording = True
+
+    def __init__(self, kind, name, attrs):
+        self.record = {"kind": kind, "name": name, **attrs}
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self.record["start"] = time.time()
+        self.record["run"] = getattr(_local, "run", None)
+        self.record["thread"] = threading.current_thread().name
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["duration_ms"] = round((time.perf_counter() - self._start) * 1000, 3)
+        if exc_type is not None:
+            self.record["error"] = repr(exc)
+        with _lock:
+            _spans.append(self.record)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only once the work is done, e.g. ``rows_out``."""
+        self.record.update(attrs)
+
+
+def span(kind, name, **attrs):
+    """Context manager timing one unit of work.
+
+    Use ``span.recording`` to skip computing attributes that are only
+    needed for the trace.
+    """
+    if not _enabled and not getattr(_local, "record", False):
+        return _NULL
+    return Span(kind, name, attrs)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def start_run(record=False):
+    """Mark the start of a script run on this thread, returns its id.
+
+    With ``record`` the spans of the run are recorded even when tracing
+    is off.
+    """
+    _local.run = next(_runs)
+    _local.record = record
+    return _local.run
+
+
+def current_run():
+    """``(run id, record)`` of the script run on this thread."""
+    return getattr(_local, "run", None), getattr(_local, "record", False)
+
+
+@contextlib.contextmanager
+def in_run(run, record=False):
+    """Record the spans of this thread under ``run``, for worker threads."""
+    previous = current_run()
+    _local.run, _local.record = run, record
+    try:
+        yield
+    finally:
+        _local.run, _local.record = previous
+
+
+def spans(run=None):
+    """Recorded spans, oldest first, optionally only those of one run."""
+    with _lock:
+        records = list(_spans)
+    if run is not None:
+        records = [record for record in records if record.get("run") == run]
+    return records
+
+
+def clear():
+    with _lock:
+        _spans.clear()
+
+
+def to_jsonl(records=None):
+    records = spans() if records is None else records
+    return "".join(json.dumps(record, default=str) + "\n" for record in records)
+
+
+def export_jsonl(path, records=None):
+    """Append spans to a JSON lines file, returns the number written."""
+    records = spans() if records is None else records
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(to_jsonl(records))
+    return len(records)